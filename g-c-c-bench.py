@@ -0,0 +1,181 @@
+#!/usr/bin/python
+# License: GNU GPL Version 3 (https://www.gnu.org/licenses/gpl-3.0.html)
+# Benchmarks for the Giant Chess Clock (g-c-c.py)
+#
+# Runs the clock with a simulated LED strip in virtual time and measures what matters for the 100ms frame budget:
+# the cost of a frame and of its parts, strip.show() calls per second, doAction() throughput and the CPU time
+# needed per second of game time in every state, per board when several boards share the Pi, and the same for a big
+# clock with about 1000 pixels (BigLayout). The results are written as JSON, and --compare checks them
+# against a saved baseline - so every change to g-c-c.py shows if it made things worse (run it on the Pi 2B!).
+#
+# g-c-c-bench.py [--output FILE] [--compare BASELINE] [--threshold PERCENT] [--seconds N]
+#
+import argparse
+import json
+import platform
+import sys
+import time
+import timeit
+
+from twisted.internet import task
+
+import gcc   # g-c-c.py itself, see gcc.py
+
+# 12 pixels per segment, an hours digit and a second pair of dots per display: 1000 pixels per board
+BigLayout = {"pixels": 1000, "segment_pixels": 12, "dots_pixels": 8, "tenths_below": 20,
+             "displays": [{"digits": [0, 84, 176, 260], "dots": [168, 344], "hours": 352},
+                          {"digits": [436, 520, 612, 696], "dots": [604, 780], "hours": 788}]}
+
+Results = {}   # name -> {"value": ..., "unit": ..., "better": "lower" or "higher"}
+
+def Result(name, value, unit, better="lower"):
+    Results[name] = {"value": value, "unit": unit, "better": better}
+    print ("%-28s %12.3f %s" % (name, value, unit))
+
+def Boot(*actions, **options): # fresh boards in virtual time (boards=N, chained on one LED channel like BoardSetups), then the given button presses on all of them
+    clock = task.Clock()
+    gcc.Now = clock.seconds
+    gcc.layout = gcc.Layout(options.get("layout", {}))
+    gcc.CompileGlyphs()
+    gcc.LED_COUNT = gcc.layout.Count
+    count = options.get("boards", 1)
+    channels = [gcc.LED_CHANNEL] * count
+    gcc.frames = {}
+    for channel in sorted(set(channels)):
+        pixels = gcc.LED_COUNT * channels.count(channel)
+        gcc.frames[channel] = gcc.FrameBuffer(gcc.FakeStrip(pixels, History=1), pixels, channel)
+    boards = []
+    for n in range(count):
+        boards.append(gcc.Board(n + 1, gcc.frames[channels[n]], gcc.LED_COUNT * channels[:n].count(channels[n])))
+    gcc.boards = boards
+    gcc.scheduler = gcc.FrameScheduler(boards, clock)
+    for board in boards:
+        board.CurrentState = gcc.StartState
+        board.doAction(board.CurrentState, gcc.ActionMinutes)
+    gcc.scheduler.start()
+    for action in actions:
+        clock.advance(1.0)
+        for board in boards:
+            board.doAction(board.CurrentState, action)
+        gcc.scheduler.request()
+    clock.advance(0)
+    return clock, gcc.frames[0].Strip
+
+def Run(clock, seconds): # let virtual time pass frame by frame, the strips get every frame like from the render threads
+    for i in range(int(round(seconds / gcc.FramePeriod))):
+        clock.advance(gcc.FramePeriod)
+        SendPending()
+
+def SendPending(): # the strips get the frames that are still pending, e.g. the one Boot() left
+    for channel in gcc.frames:
+        gcc.frames[channel].sendPending()
+
+def Best(func, number): # seconds per call, best of 5 runs
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+def BenchRendering(name="", layout={}): # name: suffix of the results, layout: the layout description to use
+    clock, strip = Boot(gcc.ActionStartPause, gcc.ActionGreenButtonPressed, layout=layout)
+    board = gcc.boards[0]
+    def redraw(draw):   # the Drawn cache would skip every call after the first one - measure the drawing itself
+        def call():
+            board.Drawn = [None, None]
+            draw()
+        return call
+    Result("show_clocks" + name, Best(redraw(board.ShowClocks), 2000) * 1e6, "us")
+    Result("display_number" + name, Best(redraw(lambda: board.displayNumber(gcc.DisplayRed, 3599)), 5000) * 1e6, "us")
+    Result("display_symbol" + name, Best(redraw(lambda: board.displaySymbol(gcc.DisplayRed, "----")), 5000) * 1e6, "us")
+    t = Best(gcc.scheduler.frame, 2000)
+    Result("frame" + name, t * 1e6, "us")
+    Result("frame_budget" + name, t / gcc.FramePeriod * 100, "%")
+    times = [3599 - n for n in range(10)]
+    def second():    # a running clock, one second later in every frame - so a digit changes
+        board.RunBase = times[gcc.scheduler.Frames % 10]
+        gcc.scheduler.frame()
+    Result("frame_second" + name, Best(second, 2000) * 1e6, "us")
+    frame = gcc.frames[0]
+    pixels = frame.Pixels[:]
+    everything = [(0, len(pixels))]
+    Result("render_send" + name, Best(lambda: frame.send(pixels, everything), 1000) * 1e6, "us")   # a completely new frame
+    digit = [(board.DigitBases[gcc.DisplayRed][0], board.DigitBases[gcc.DisplayRed][1])]
+    Result("render_send_digit" + name, Best(lambda: frame.send(pixels, digit), 5000) * 1e6, "us")  # only one digit changed
+
+def BenchTransitions():
+    Boot(gcc.ActionStartPause, gcc.ActionGreenButtonPressed)
+    board = gcc.boards[0]
+    presses = [gcc.ActionRedButtonPressed, gcc.ActionGreenButtonPressed]
+    n = 20000
+    start = time.perf_counter()
+    for i in range(n):
+        board.doAction(board.CurrentState, presses[i % 2])
+    Result("do_action", n / (time.perf_counter() - start), "transitions/s", "higher")
+
+def BenchStates(seconds):
+    states = [("setup", [], 0),
+              ("prestart", [gcc.ActionStartPause], 0),
+              ("running", [gcc.ActionStartPause, gcc.ActionGreenButtonPressed], 0),
+              ("paused", [gcc.ActionStartPause, gcc.ActionGreenButtonPressed, gcc.ActionStartPause], 0),
+              ("flagged", [gcc.ActionStartPause, gcc.ActionGreenButtonPressed], 200)]   # 3 minutes are over after 200s
+    for name, actions, before in states:
+        clock, strip = Boot(*actions)
+        Run(clock, before)
+        SendPending()         # the frame of the last button press does not belong to the measured windows
+        shows = strip.ShowCount
+        frames = gcc.scheduler.Frames
+        cpu = []
+        for i in range(3):    # the best of 3 windows, the values are small and easily disturbed
+            start = time.process_time()
+            Run(clock, seconds / 3.0)
+            cpu.append(time.process_time() - start)
+        Result("cpu_" + name, min(cpu) * 3.0 / seconds * 1000, "ms/s")
+        Result("frames_" + name, (gcc.scheduler.Frames - frames) / float(seconds), "frames/s")
+        Result("shows_" + name, (strip.ShowCount - shows) / float(seconds), "shows/s")
+
+def BenchBoards(seconds): # CPU time per board and second of game time with 1, 2, 4 and 8 running boards
+    for count in [1, 2, 4, 8]:
+        clock, strip = Boot(gcc.ActionStartPause, gcc.ActionGreenButtonPressed, boards=count)
+        SendPending()
+        cpu = []
+        for i in range(3):
+            start = time.process_time()
+            Run(clock, seconds / 3.0)
+            cpu.append(time.process_time() - start)
+        Result("cpu_per_board_%d" % count, min(cpu) * 3.0 / seconds * 1000 / count, "ms/s")
+
+def Compare(baseline, threshold): # True if nothing got worse by more than threshold percent
+    ok = True
+    print ("")
+    print ("%-28s %12s %12s %9s" % ("", "baseline", "current", "change"))
+    for name in sorted(Results):
+        if name not in baseline["results"]:
+            continue
+        old = baseline["results"][name]["value"]
+        new = Results[name]["value"]
+        change = (new - old) / old * 100 if old else 0.0
+        worse = change > threshold if Results[name]["better"] == "lower" else change < -threshold
+        if worse:
+            ok = False
+        print ("%-28s %12.3f %12.3f %+8.1f%%%s" % (name, old, new, change, "  WORSE" if worse else ""))
+    return ok
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks the Giant Chess Clock with a simulated LED strip")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent a result may get worse in --compare (default 10)")
+    parser.add_argument("--seconds", type=float, default=60.0, help="seconds of game time per state (default 60)")
+    args = parser.parse_args()
+
+    BenchRendering()
+    BenchRendering("_1000px", BigLayout)
+    BenchTransitions()
+    BenchStates(args.seconds)
+    BenchBoards(args.seconds)
+
+    report = {"machine": platform.machine(), "python": platform.python_version(), "time": time.strftime("%Y-%m-%d %H:%M:%S"), "results": Results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            if not Compare(json.load(f), args.threshold):
+                sys.exit(1)
@@ -0,0 +1,191 @@
+#!/usr/bin/python
+# License: GNU GPL Version 3 (https://www.gnu.org/licenses/gpl-3.0.html)
+# Tournament hub for the Giant Chess Clock (g-c-c.py)
+#
+# Every clock started with "g-c-c.py --hub HOST --board N" sends its state here (see HubClient in g-c-c.py) - a clock
+# with several boards ("--boards M") reports them as boards N to N+M-1 over the same connection. The hub
+# keeps a live table of all boards and serves it to the arbiter: http://HOST:8080/ is a page that reloads itself,
+# http://HOST:8080/boards.json the same table as JSON.
+# Incoming records only update the table (one dict entry per board). The page and the JSON are built at most once
+# per DashboardPeriod, no matter how many clocks send and how often the dashboard is loaded - so 50 and more clocks
+# at 10 Hz stay cheap.
+# The hub listens on --interface only (127.0.0.1 unless given - real clocks need the address of the LAN), and a clock
+# must send the --token of the hub first (see HubHello in g-c-c.py), else it is disconnected. The dashboard has no
+# login: it is read-only, but everybody who can reach the interface can see it.
+# With --simulate N the hub starts N simulated clocks on this machine that connect to it like real ones, each with
+# --boards-per-clock boards. They play with the Boards and the HubClient of g-c-c.py.
+#
+# g-c-c-hub.py --token TOKEN [--interface ADDRESS] [--port N] [--http N] [--simulate N] [--boards-per-clock M]
+#
+import argparse
+import hmac
+import json
+import random
+
+from twisted.internet import reactor, task
+from twisted.internet.protocol import Factory, Protocol
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+
+import gcc   # g-c-c.py itself, see gcc.py
+
+HttpPort = 8080
+Interface = "127.0.0.1"  # address the hub and its dashboard listen on (e.g. "0.0.0.0" for all interfaces)
+DashboardPeriod = 0.5   # seconds, the dashboard is not rebuilt more often
+StatsPeriod = 10.0      # seconds between two lines of hub statistics
+StaleAfter = 5.0        # seconds without a record after which a running clock is marked as stale
+
+StateNames = {1: "setup minutes", 2: "setup increment", 3: "ready", 4: "red to move", 5: "green to move",
+              6: "paused (red)", 7: "paused (green)", 8: "reboot", 9: "shutdown"}
+
+Boards = {}      # board -> dict with the last state of that clock
+Stats = {"records": 0, "connections": 0, "builds": 0, "rejected": 0}
+
+class ClockConnection(Protocol):
+    def connectionMade(self):
+        self.Buffer = b""
+        self.Boards = set()
+        self.Hello = False     # the token has been checked
+        Stats["connections"] += 1
+
+    def dataReceived(self, data):
+        self.Buffer += data
+        if not self.Hello:
+            if len(self.Buffer) < gcc.HubHello.size:
+                return
+            magic, length = gcc.HubHello.unpack_from(self.Buffer, 0)
+            end = gcc.HubHello.size + length
+            if magic == gcc.HubMagic and len(self.Buffer) < end:
+                return
+            if magic != gcc.HubMagic or not hmac.compare_digest(self.Buffer[gcc.HubHello.size:end], self.factory.Token):
+                Stats["rejected"] += 1
+                self.transport.loseConnection()
+                return
+            self.Hello = True
+            self.Buffer = self.Buffer[end:]
+        size = gcc.HubRecord.size
+        end = len(self.Buffer) // size * size
+        now = reactor.seconds()
+        for offset in range(0, end, size):
+            board, sequence, state, flags, red, green, moves = gcc.HubRecord.unpack_from(self.Buffer, offset)
+            Boards[board] = {"board": board, "sequence": sequence, "state": state, "flags": flags, "red": red,
+                             "green": green, "moves": moves, "seen": now, "online": True}
+            self.Boards.add(board)
+        Stats["records"] += end // size
+        self.Buffer = self.Buffer[end:]
+
+    def connectionLost(self, reason):
+        Stats["connections"] -= 1
+        for board in self.Boards:
+            if board in Boards:
+                Boards[board]["online"] = False
+
+def FormatTime(ms):
+    seconds = max(0, ms) // 1000
+    return "%d:%02d" % (seconds // 60, seconds % 60)
+
+class Dashboard(Resource):
+    isLeaf = True
+
+    def __init__(self):
+        Resource.__init__(self)
+        self.Built = None
+        self.JSON = b""
+        self.HTML = b""
+
+    def build(self):
+        now = reactor.seconds()
+        if self.Built is not None and now - self.Built < DashboardPeriod:
+            return
+        self.Built = now
+        Stats["builds"] += 1
+        table = []
+        for board in sorted(Boards):
+            b = dict(Boards[board])
+            b["age"] = round(now - b.pop("seen"), 1)
+            b["stale"] = not b["online"] or (b["flags"] & gcc.HubGameRunning != 0 and b["age"] > StaleAfter)
+            table.append(b)
+        self.JSON = json.dumps(table).encode("utf-8")
+        rows = []
+        for b in table:
+            flag = " ".join(name for bit, name in [(gcc.HubFlagRed, "red out of time"), (gcc.HubFlagGreen, "green out of time")] if b["flags"] & bit)
+            rows.append("<tr%s><td>%d</td><td>%s</td><td>%s</td><td>%s</td><td>%d</td><td>%s</td><td>%.1fs</td></tr>" %
+                        (' class="stale"' if b["stale"] else "", b["board"], StateNames.get(b["state"], b["state"]),
+                         FormatTime(b["red"]), FormatTime(b["green"]), b["moves"], flag, b["age"]))
+        self.HTML = ("<!DOCTYPE html><html><head><meta charset=\"utf-8\"><meta http-equiv=\"refresh\" content=\"1\">"
+                     "<title>Giant Chess Clocks</title><style>td,th{padding:2px 12px;text-align:right}.stale{color:#999}</style></head>"
+                     "<body><table><tr><th>Board</th><th>State</th><th>Red</th><th>Green</th><th>Moves</th><th>Flag</th><th>Last update</th></tr>"
+                     + "".join(rows) + "</table></body></html>").encode("utf-8")
+
+    def render_GET(self, request):
+        self.build()
+        if request.path == b"/boards.json":
+            request.setHeader(b"content-type", b"application/json")
+            return self.JSON
+        request.setHeader(b"content-type", b"text/html; charset=utf-8")
+        return self.HTML
+
+# A simulated clock: real boards of g-c-c.py (without LEDs) play games with random think times, and a HubClient sends
+# their state in every frame - the same client code a real clock runs, on the same FramePeriod.
+class SimulatedClock:
+    def __init__(self, Numbers, Token):
+        self.Boards = [gcc.Board(number, None) for number in Numbers]   # never drawn, only their state is sent
+        self.Client = gcc.HubClient(self.Boards, Token)
+        self.NextMove = {}     # board number -> Now() of its next button press
+        for board in self.Boards:
+            board.CurrentState = gcc.StartState
+            board.doAction(board.CurrentState, gcc.ActionMinutes)
+            self.newGame(board)
+        self.Loop = task.LoopingCall(self.frame)
+
+    def start(self, host, port):
+        reactor.connectTCP(host, port, self.Client)
+        self.Loop.start(gcc.FramePeriod)
+
+    def newGame(self, board):
+        for action in [gcc.ActionReset, gcc.ActionStartPause, random.choice([gcc.ActionGreenButtonPressed, gcc.ActionRedButtonPressed])]:
+            board.doAction(board.CurrentState, action)
+        self.NextMove[board.Number] = gcc.Now() + random.uniform(1, 10)
+
+    def frame(self):
+        t = gcc.Now()
+        for board in self.Boards:
+            if t >= self.NextMove[board.Number]:
+                if '----' in board.ShowSymbols:
+                    self.newGame(board)     # out of time: the next game starts
+                    continue
+                button = {4: gcc.ActionRedButtonPressed, 5: gcc.ActionGreenButtonPressed}[board.CurrentState]   # the running side moves
+                board.doAction(board.CurrentState, button)
+                self.NextMove[board.Number] = t + random.uniform(1, 10)
+            board.DecrementClocks()
+        self.Client.update()
+
+def PrintStats(last=[0, 0.0]):
+    now = reactor.seconds()
+    if last[1]:
+        print ("boards: %d, connections: %d, records/s: %.0f, dashboard builds: %d, rejected: %d" %
+               (len(Boards), Stats["connections"], (Stats["records"] - last[0]) / (now - last[1]), Stats["builds"], Stats["rejected"]))
+    last[0] = Stats["records"]
+    last[1] = now
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tournament hub for Giant Chess Clocks")
+    parser.add_argument("--token", required=True, help="clocks must send this token (g-c-c.py --hub-token)")
+    parser.add_argument("--interface", default=Interface, metavar="ADDRESS", help="address the hub and the dashboard listen on (default %s)" % Interface)
+    parser.add_argument("--port", type=int, default=gcc.HubPort, help="TCP port for the clocks (default %d)" % gcc.HubPort)
+    parser.add_argument("--http", type=int, default=HttpPort, help="HTTP port of the dashboard (default %d)" % HttpPort)
+    parser.add_argument("--simulate", type=int, default=0, metavar="N", help="start N simulated clocks")
+    parser.add_argument("--boards-per-clock", type=int, default=1, metavar="M", help="boards of every simulated clock (default 1)")
+    args = parser.parse_args()
+
+    token = args.token.encode("utf-8")
+    clocks = Factory.forProtocol(ClockConnection)
+    clocks.Token = token
+    reactor.listenTCP(args.port, clocks, interface=args.interface)
+    reactor.listenTCP(args.http, Site(Dashboard()), interface=args.interface)
+    for clock in range(args.simulate):
+        first = clock * args.boards_per_clock + 1
+        SimulatedClock(list(range(first, first + args.boards_per_clock)), token).start("127.0.0.1" if args.interface in ("", "0.0.0.0") else args.interface, args.port)
+    task.LoopingCall(PrintStats).start(StatsPeriod)
+    print ("Hub for the clocks on %s port %d, dashboard on http://%s:%d/" % (args.interface, args.port, args.interface, args.http))
+    reactor.run()
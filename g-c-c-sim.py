@@ -0,0 +1,194 @@
+#!/usr/bin/python
+# License: GNU GPL Version 3 (https://www.gnu.org/licenses/gpl-3.0.html)
+# Game simulator for the Giant Chess Clock (g-c-c.py)
+#
+# Plays games in virtual time: the clock of g-c-c.py is a twisted task.Clock, the buttons are fed directly into
+# the doAction() of a Board and the LEDs are a FakeStrip. So thousands of games run in the time of one real blitz game, and after
+# every button press and every frame a few invariants are checked:
+#  - a clock may only show a negative time together with its flag ("----")
+#  - the running clock is charged exactly the (virtual) time that passed, the other clock does not change
+#  - resuming after a pause never credits an increment
+#  - every transition follows the StateTable, and every state is reached in the end
+#
+# g-c-c-sim.py [--games N] [--moves N] [--seed N] [--script FILE]
+# A script has one button press per line: "<seconds to wait before> <action>", e.g. "2.5 green". Actions are
+# minutes, increment, reset, start, green, red, longreset, verylongreset. # starts a comment.
+#
+import argparse
+import random
+import sys
+import time
+
+from twisted.internet import task
+
+import gcc   # g-c-c.py itself, see gcc.py
+
+ActionNames = {"minutes": gcc.ActionMinutes,
+               "increment": gcc.ActionIncrement,
+               "reset": gcc.ActionReset,
+               "start": gcc.ActionStartPause,
+               "green": gcc.ActionGreenButtonPressed,
+               "red": gcc.ActionRedButtonPressed,
+               "longreset": gcc.ActionLongReset,
+               "verylongreset": gcc.ActionVeryLongReset}
+
+Epsilon = 0.000001   # seconds, float tolerance of the timekeeping checks
+
+class Simulator:
+    def __init__(self):
+        self.Clock = task.Clock()
+        gcc.Now = self.Clock.seconds
+        gcc.SystemCommand = self.systemCommand
+        self.Frame = gcc.FrameBuffer(gcc.FakeStrip(gcc.LED_COUNT, History=1), gcc.LED_COUNT)
+        self.Board = None
+        gcc.scheduler = gcc.FrameScheduler([], self.Clock)
+        self.Game = 0
+        self.Games = 0
+        self.Presses = 0
+        self.Frames = 0
+        self.Commands = []
+        self.Violations = []
+        self.States = set()
+        self.Actions = set()
+
+    def systemCommand(self, command): # reboot/shutdown: the game is over, the clock boots again
+        self.Commands.append(command)
+        return 0
+
+    def violation(self, text):
+        self.Violations.append("game %d, %.3fs, state %d: %s" % (self.Game, gcc.Now(), self.Board.CurrentState, text))
+
+    def boot(self): # a new board for every game, like a clock that was switched on
+        if gcc.scheduler.Call is not None and gcc.scheduler.Call.active():
+            gcc.scheduler.Call.cancel()
+        self.Board = gcc.Board(1, self.Frame)
+        gcc.scheduler.Boards[:] = [self.Board]
+        self.Board.CurrentState = gcc.StartState
+        self.Board.doAction(self.Board.CurrentState, gcc.ActionMinutes)
+        gcc.scheduler.start()
+        self.States.add(self.Board.CurrentState)
+
+    def times(self):
+        return {gcc.DisplayRed: self.Board.TimeRed, gcc.DisplayGreen: self.Board.TimeGreen}
+
+    def checkFlags(self):
+        if self.Board.CurrentState in [4,5,6,7]:
+            for display, t in self.times().items():
+                if t < 0 and self.Board.ShowSymbols[display] != '----':
+                    self.violation("negative time %.3f without flag on display %d" % (t, display))
+
+    def press(self, action):
+        board = self.Board
+        before = board.CurrentState
+        times = self.times()
+        expected = gcc.StateTable[before - 1][action - 1]
+        board.doAction(board.CurrentState, action, gcc.Now())
+        gcc.scheduler.request()
+        self.Presses += 1
+        self.Actions.add(action)
+        self.States.add(board.CurrentState)
+        if board.CurrentState != expected or board.CurrentState not in gcc.FunctionSwitcher:
+            self.violation("action %d in state %d led to state %d instead of %d" % (action, before, board.CurrentState, expected))
+        for paused, resumed, display in [(6, 4, gcc.DisplayRed), (7, 5, gcc.DisplayGreen)]:
+            if before == paused and board.CurrentState == resumed and abs(self.times()[display] - times[display]) > Epsilon:
+                self.violation("increment credited after a pause: %.3f -> %.3f" % (times[display], self.times()[display]))
+        self.checkFlags()
+
+    def wait(self, seconds): # let virtual time pass, frame by frame
+        start = gcc.Now()
+        times = self.times()
+        running = {4: gcc.DisplayRed, 5: gcc.DisplayGreen}.get(self.Board.CurrentState) if self.Board.Game_Running else None
+        frames = gcc.scheduler.Frames
+        while seconds > Epsilon:
+            step = min(seconds, gcc.FramePeriod)
+            self.Clock.advance(step)
+            self.Frame.sendPending()
+            seconds -= step
+        self.Frames += gcc.scheduler.Frames - frames
+        self.Board.DecrementClocks()      # bring the clocks to this exact moment, the last frame may be a bit older
+        for display, t in self.times().items():
+            if display == running:
+                elapsed = gcc.Now() - start
+                if abs(times[display] - (t + elapsed)) > Epsilon:
+                    self.violation("display %d was charged %.6fs for %.6fs" % (display, times[display] - t, elapsed))
+            elif t != times[display]:
+                self.violation("display %d changed from %.3f to %.3f while not running" % (display, times[display], t))
+        self.checkFlags()
+
+    def step(self, delay, action):
+        self.wait(delay)
+        if self.Board.CurrentState in [8,9]:
+            return False
+        self.press(action)
+        return self.Board.CurrentState not in [8,9]
+
+    def play(self, steps):
+        self.Game += 1
+        self.boot()
+        for delay, action in steps:
+            if not self.step(delay, action):
+                break
+        self.Games += 1
+
+def RandomGame(sim, rng, moves): # a random button sequence: some setup, then mostly the right player pressing
+    for i in range(rng.randint(0, 12)):
+        yield rng.uniform(0.2, 2.0), rng.choice([gcc.ActionMinutes, gcc.ActionIncrement])
+    yield rng.uniform(0.5, 5.0), gcc.ActionStartPause
+    for i in range(moves):
+        if rng.random() < 0.05:
+            delay = rng.uniform(10, 200)          # a long think, sometimes long enough to lose on time
+        else:
+            delay = min(rng.expovariate(1 / 3.0), 60)
+        r = rng.random()
+        if r < 0.85:
+            if sim.Board.CurrentState == 5:
+                action = gcc.ActionGreenButtonPressed
+            elif sim.Board.CurrentState == 4:
+                action = gcc.ActionRedButtonPressed
+            else:
+                action = rng.choice([gcc.ActionGreenButtonPressed, gcc.ActionRedButtonPressed])
+        elif r < 0.95:
+            action = rng.choice([gcc.ActionStartPause, gcc.ActionGreenButtonPressed, gcc.ActionRedButtonPressed, gcc.ActionMinutes, gcc.ActionIncrement])
+        elif r < 0.99:
+            action = gcc.ActionReset
+        else:
+            action = rng.choice([gcc.ActionLongReset, gcc.ActionVeryLongReset])
+        yield delay, action
+
+def ReadScript(path):
+    steps = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#")[0].split()
+            if line:
+                steps.append((float(line[0]), ActionNames[line[1].lower()]))
+    return steps
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Plays Giant Chess Clock games in virtual time and checks invariants")
+    parser.add_argument("--games", type=int, default=1000, help="number of games")
+    parser.add_argument("--moves", type=int, default=80, help="button presses per random game")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the random games")
+    parser.add_argument("--script", help="replay this button sequence instead of random games")
+    args = parser.parse_args()
+
+    script = ReadScript(args.script) if args.script else None
+    rng = random.Random(args.seed)
+    sim = Simulator()
+    start = time.perf_counter()
+    for n in range(args.games):
+        sim.play(script if script is not None else RandomGame(sim, rng, args.moves))
+    wall = time.perf_counter() - start
+
+    print ("Games: %d, presses: %d, frames: %d, reboots/shutdowns: %d" % (sim.Games, sim.Presses, sim.Frames, len(sim.Commands)))
+    print ("%.1f games/s, %.0f s of game time in %.2f s (%.0fx real time)" % (sim.Games / wall, sim.Clock.seconds(), wall, sim.Clock.seconds() / wall))
+    unreached = sorted(set(gcc.FunctionSwitcher) - sim.States)
+    unused = sorted(set(ActionNames.values()) - sim.Actions)
+    if script is not None:
+        print ("States never reached: %s, actions never used: %s" % (unreached, unused))   # a script may cover only a part
+    elif unreached:
+        sim.Violations.append("states never reached: %s (actions never used: %s)" % (unreached, unused))
+    print ("Invariant violations: %d" % len(sim.Violations))
+    for v in sim.Violations[:20]:
+        print ("  " + v)
+    sys.exit(1 if sim.Violations else 0)
@@ -9,15 +9,37 @@
 # twisted from https://twistedmatrix.com/trac/
 # plus some "standard" python libraries/modules (time, os, datetime)
 # test on a RPI 2B running with raspbian. Don't forget to install and setup pigpiod!
+# Without a Raspberry Pi (no pigpio/neopixel) the clock runs with simulated buttons and LEDs: g-c-c.py --sim
 #
+import argparse
+import json
 import time
-import pigpio
 import os
+import mmap
+import signal
+import socket
+import struct
+import sys
+import threading
+import zlib
 
+from array import array
+from collections import deque
 from datetime import datetime
-from neopixel import *
-from twisted.internet import task
 from twisted.internet import reactor
+from twisted.internet.protocol import DatagramProtocol, Protocol, ReconnectingClientFactory
+from twisted.protocols.basic import LineReceiver
+
+try:
+    import pigpio
+except ImportError:
+    pigpio = None           # no Raspberry Pi - only the SimulatedBackend can be used
+try:
+    from neopixel import Adafruit_NeoPixel, Color, ws
+except ImportError:
+    Adafruit_NeoPixel = None
+    def Color(red, green, blue, white = 0): # same packing of a pixel colour as in rpi_ws281x
+        return (white << 24) | (red << 16) | (green << 8) | blue
 
 #GPIO Pins used for the adjustment/start/reset Buttons
 INCREMENT=23
@@ -29,14 +51,17 @@ RESET=21
 BUTTONGREEN=17
 BUTTONRED=27
 
+#Every board has its own set of buttons (button name -> GPIO pin). The first set are the pins above.
+ButtonSets = [{"increment": INCREMENT, "minutes": MINUTES, "start": START, "reset": RESET, "green": BUTTONGREEN, "red": BUTTONRED},
+              {"increment": 5, "minutes": 6, "start": 12, "reset": 16, "green": 20, "red": 26},
+              {"increment": 4, "minutes": 22, "start": 7, "reset": 8, "green": 9, "red": 19}]
+
 #accordingly we have a "Red" Display and a "Green" Display. Display and Button of the same color are on the same side of the clock!
 DisplayRed=1           # The "RED" Display has Index 1   (left side)
 DisplayGreen=0         # The "GREEN" Display has Index 0 (right side)
 
-#this is implemented as a deterministic finite state machine (more or less)
+#this is implemented as a deterministic finite state machine (more or less), one per Board
 StartState = 1 # loop Minutes
-CurrentState = 0 # no current State
-FormerState = 0 # no former State
 
 # States:
 # 1: loop Minute/Time modes
@@ -78,387 +103,1608 @@ StateTable = [[1,2,1,3,1,1,8,9],
 MinuteModes = [1,3,5,10,15,20,25,30,45,60]  # numbers are in minutes
 IncrementModes = [0,1,2,3,4,5,10,15,30,60]    # numbers are in seconds
 
-MinuteIndex = 0
-IncrementIndex = 0             
-MinuteMode=MinuteModes[MinuteIndex]          # 1 minute Game is setup on Program startup. This will be "pushed" to 3 Min when DFA is initialized. So 3 Min game is the default
-IncrementMode=IncrementModes[IncrementIndex] # 0 seconds increment is the default
+# Timekeeping: the clocks are not decremented tick by tick. Instead we remember when the running clock was
+# started and how much time it had then. The time shown is always "time at start - time really passed", measured
+# on a monotonic clock. So a late or stalled loop will never make a clock lose (or win) time, and there is no
+# float error adding up over a long game.
+Now = time.monotonic   # all timekeeping is done on this clock
+
+# Logging: printing to stdout (a serial console or journald) costs real milliseconds, so Log() only appends the event
+# to an in-memory ring - the last LogSize events are always there for diagnosis (they are part of DumpStats). A writer
+# thread formats and writes the new events in batches every LogFlushPeriod, never the reactor - and nobody else does:
+# sync() and stop() only wake the writer and wait for it. Events below LogLevel (--log-level) are dropped at once,
+# and events listed in LogRates are logged at most once per that many seconds (the number of suppressed events is
+# added to the next one).
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LevelNames = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+LogLevel = INFO
+LogSize = 1000              # events kept in memory
+LogFlushPeriod = 1.0        # seconds between two batched writes
+LogRates = {"game running": 1.0,   # event -> minimum seconds between two logged events
+            "loop lag": 1.0,
+            "mirror rejected": 1.0,
+            "tick clamped": 1.0}
+
+class EventLog:
+    def __init__(self, Size=LogSize, Output=None):
+        self.Ring = deque(maxlen=Size)   # (time.time(), level, event, fields) of the last events
+        self.Unwritten = deque()         # events the writer thread has not written yet
+        self.Output = Output
+        self.Last = {}                   # event -> Now() it was last logged (for LogRates)
+        self.Suppressed = {}             # event -> events dropped by LogRates since then
+        self.Wakeup = threading.Event()
+        self.Waiters = deque()           # threading.Events of sync() calls, set after the next write
+        self.Stopping = False
+        self.Writer = None               # the writer thread, once started
+
+    def add(self, level, event, fields):
+        rate = LogRates.get(event)
+        if rate is not None:
+            t = Now()
+            if t - self.Last.get(event, -rate) < rate:
+                self.Suppressed[event] = self.Suppressed.get(event, 0) + 1
+                return
+            self.Last[event] = t
+            if self.Suppressed.get(event):
+                fields["suppressed"] = self.Suppressed.pop(event)
+        record = (time.time(), level, event, fields)
+        self.Ring.append(record)
+        if self.Output is not None:
+            self.Unwritten.append(record)
+
+    def start(self, Output): # from now on the events are written to Output by a thread
+        self.Output = Output
+        self.Writer = threading.Thread(target=self.writer, name="log")
+        self.Writer.daemon = True
+        self.Writer.start()
+
+    def sync(self, Timeout=LogFlushPeriod): # wait (at most Timeout) until the writer has written all events logged so far
+        if self.Writer is None:
+            return
+        done = threading.Event()
+        self.Waiters.append(done)
+        self.Wakeup.set()
+        done.wait(Timeout)
+
+    def stop(self): # on shutdown: the writer writes the last events and ends
+        if self.Writer is None:
+            return
+        self.Stopping = True
+        self.Wakeup.set()
+        self.Writer.join()
+
+    def writer(self):
+        while True:
+            self.Wakeup.wait(LogFlushPeriod)
+            self.Wakeup.clear()
+            stopping = self.Stopping
+            waiters = []
+            while self.Waiters:            # taken before the write, so all their events are in it
+                waiters.append(self.Waiters.popleft())
+            self.flush()
+            for done in waiters:
+                done.set()
+            if stopping:
+                return
+
+    def flush(self): # writer thread: write all unwritten events with one write()
+        lines = []
+        while self.Unwritten:
+            lines.append(FormatEvent(self.Unwritten.popleft()))
+        if lines and self.Output is not None:
+            self.Output.write("".join(lines))
+            self.Output.flush()
+
+    def dump(self, out): # the last LogSize events, written or not
+        for record in list(self.Ring):
+            out.write(FormatEvent(record))
+
+def FormatEvent(record):
+    t, level, event, fields = record
+    text = " ".join("%s=%s" % (key, fields[key]) for key in sorted(fields))
+    return "%s.%03d %-7s %s %s\n" % (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t)), int(t * 1000) % 1000, LevelNames[level], event, text)
 
-Game_Running = False           # Will be set to True as soon as the Red or Green Button was pressed while in "Prestart" state -> One Clock starts "Count-Down"
-Start_Time = 0
+eventlog = EventLog()
+
+def Log(level, event, **fields):
+    if level >= LogLevel:
+        eventlog.add(level, event, fields)
+
+# Debouncing of the big Push-Buttons: a glitch filter only reports a press after the level has been stable for the
+# whole filter time - and with 0.1 sec this time is billed to the player who just moved, on every move. So the big
+# buttons get a very short hardware glitch filter - just enough that a noise spike on their long leads is not a
+# move - and the Debouncer below takes the first clean edge immediately and rejects all bouncing that follows within
+# the window. pigpio stamps a filtered edge the filter time after it happened, so that time is taken off again (see
+# TickToNow): the result is the exact moment the move ended.
+GlitchFilter = {"increment": 100000,   # hardware glitch filter per button in microseconds (pigpio set_glitch_filter)
+                "minutes": 100000,
+                "start": 100000,
+                "reset": 100000,
+                "green": 1500,
+                "red": 1500}
+DebounceWindow = {"green": 50000,      # software debounce window per button in microseconds
+                  "red": 50000}
+
+class Debouncer:
+    def __init__(self, Window):
+        self.Window = Window  # GPIO pin -> debounce window in microseconds
+        self.LastTick = {}    # tick of the last accepted edge per pin
+        self.Accepted = 0
+        self.Rejected = 0
+
+    def accept(self, gpio, tick): # True for a clean edge, False for bouncing within the window of the last accepted edge
+        last = self.LastTick.get(gpio)
+        if last is not None and TickDiff(last, tick) < self.Window.get(gpio, 0):
+            self.Rejected += 1
+            return False
+        self.LastTick[gpio] = tick
+        self.Accepted += 1
+        return True
+
+# pigpio ticks are microseconds (wrapping every ~72 minutes), our timekeeping is done on Now(). The two clocks do not
+# run at exactly the same rate (NTP slews time.monotonic by up to 500 ppm), so a tick is never converted relative to
+# an old anchor: every callback reads a fresh pair of (current tick, Now()) and the edge happened the tick difference
+# before that. A callback may come late when the Pi is busy (a strip.show() alone takes several ms), and that delay
+# is credited back in full. Only a difference beyond TickMaxAge - a stalled pigpio or a bogus tick - is capped, and
+# counted and logged, so a move can never be credited with more than that.
+TickSource = None       # the pigpio.pi() (or FakeGPIO) of the buttons, see SetupButtons
+TickMaxAge = 1.0        # seconds an edge may lie before its callback
+TickClamps = 0          # edges that were older than TickMaxAge
+
+def TickToNow(tick, Steady=0): # pigpio thread: the Now() time of the edge at tick, Steady is the glitch filter of its pin in microseconds
+    global TickClamps
+    t = Now()
+    if TickSource is None:
+        return t
+    age = TickDiff(tick, TickSource.get_current_tick())
+    if age >= 0x80000000:
+        return t        # the tick is not behind the current one
+    age = (age + Steady) / 1000000.0
+    if age > TickMaxAge:
+        TickClamps += 1
+        Log(WARNING, "tick clamped", ms=int(age * 1000))
+        age = TickMaxAge
+    return t - age
+
+# The pigpio callbacks run on pigpio's own thread, but the state machine and the clocks belong to the reactor thread.
+# So the callbacks never touch the state - they only put a timestamped event into this queue and wake up the reactor,
+# which applies all queued events in order. deque.append() and deque.popleft() are atomic, no lock is needed.
+class EventQueue:
+    def __init__(self):
+        self.Events = deque()   # (Board, Action, When, Tick) tuples, When is the Now() time of the button press, Tick its pigpio tick
+        self.Applied = 0
+        self.MaxDepth = 0       # most events that were waiting at the same time
+        self.LatencySum = 0.0   # time from the button press (pigpio tick) until the event was applied
+        self.LatencyMax = 0.0
+
+    def post(self, Board, Action, When, Tick=None): # pigpio thread
+        self.Events.append((Board, Action, When, Tick))
+        reactor.callFromThread(self.apply)
+
+    def apply(self): # reactor thread
+        depth = len(self.Events)
+        if depth > self.MaxDepth:
+            self.MaxDepth = depth
+        while self.Events:
+            Board, Action, When, Tick = self.Events.popleft()
+            latency = Now() - When
+            self.LatencySum += latency
+            if latency > self.LatencyMax:
+                self.LatencyMax = latency
+            self.Applied += 1
+            Board.doAction(Board.CurrentState, Action, When, Tick)
+        scheduler.request()   # show the new state at once
+
+events = EventQueue()
+
+def TickDiff(t1, t2): # microseconds from tick t1 to tick t2, ticks wrap around at 2^32 (like pigpio.tickDiff)
+    return (t2 - t1) & 0xffffffff
 
 Ignore_Button_Events = True    # It takes some ms until all gpio pins are initialized. All "ghost"-events must be ignored for this time
 
-# next few fuctions will define what to do, when one of the buttons is pressed (minutes, increment, start, reset, red, green)
-# For all Buttons: level == 0 => falling edge (press button), level == 1 => rising edge (release button)
-def call_reset(gpio, level, tick):
-   global resetTicks 
-   global CurrentState
-   if not(Ignore_Button_Events):
-     if level == 0:
-		#button press - we will only act on reset release as we must keep short, long and verylong press apart
-                resetTicks = tick
-     elif level == 1:
-		#button release
-                diff = pigpio.tickDiff(resetTicks, tick)
-                if diff < 5000000:
-			#Switch pressed under 5 seconds
-                        doAction(CurrentState,ActionReset)   # doAction will put the DFA into a new state
-                elif diff >= 5000000 and diff < 10000000:
-                        #Switch pressed over 5 but under 10 second -> Action 9 == LongReset
-                        doAction(CurrentState,ActionLongReset)
-                elif diff >= 10000000 :
-                        #Switch pressed over 10 second -> Action 10 == VeryLongReset
-                        doAction(CurrentState,ActionVeryLongReset)
-
-def call_start(gpio, level, tick):
-     if not(Ignore_Button_Events):
-       if level == 0:    # for all other buttons we will only act on "press" not "release"
-         print ("Start was pressed")
-         doAction(CurrentState,ActionStartPause)
-
-def call_minutes(gpio, level, tick):
-     if not(Ignore_Button_Events):
-       if level == 0:
-         print ("Minutes was pressed")
-         doAction(CurrentState,ActionMinutes)
-
-def call_increment(gpio, level, tick):
-     if not(Ignore_Button_Events):
-       if level == 0:
-         print ("Increment was pressed")
-         doAction(CurrentState,ActionIncrement)
-
-def call_button_green(gpio, level, tick):
-     if not(Ignore_Button_Events):
-       if level == 0:
-         print ("The green Button was pressed")
-         doAction(CurrentState,ActionGreenButtonPressed)
-
-def call_button_red(gpio, level, tick):
-     if not(Ignore_Button_Events):
-      if level == 0:
-         print ("The red Button was pressed")
-         doAction(CurrentState,ActionRedButtonPressed)
- 
-pi = pigpio.pi() # Connect to local Pi.
-
-resetTicks = pi.get_current_tick() #initializing var
-
-for i in [INCREMENT,MINUTES,START,RESET,BUTTONGREEN,BUTTONRED]:
-   pi.set_pull_up_down(i, pigpio.PUD_UP)    # We use the RasPI built-in Pull-Up/Down resistors...
-   pi.set_mode(i, pigpio.INPUT)             # all buttons are inputs...
-   pi.set_glitch_filter(i, 100000)          # glitch filter of 0.1 sec. This will ignore every input level change (low-high-low or high-low-high) that is
-                                            # happening faster than within 0.1 sec. This way of "debouncing" is so much more powerful than RPi.GPIOs "bouncetime" !
-                                            # If you ever had problems detecting the state of your push buttons in your RasPI Projects, try using pigpio!!!
-
-pi.callback(INCREMENT, pigpio.EITHER_EDGE, call_increment)       # now we define the callback functions for the various button events
-pi.callback(MINUTES, pigpio.EITHER_EDGE, call_minutes)
-pi.callback(START, pigpio.EITHER_EDGE, call_start)
-pi.callback(RESET, pigpio.EITHER_EDGE, call_reset)
-pi.callback(BUTTONGREEN, pigpio.EITHER_EDGE, call_button_green)
-pi.callback(BUTTONRED, pigpio.EITHER_EDGE, call_button_red)
+# same values as in pigpio, so they work with the real and with the simulated gpio
+INPUT = 0
+PUD_UP = 2
+RISING_EDGE = 0
+FALLING_EDGE = 1
+EITHER_EDGE = 2
+
+def SetupButtons(pi, Board): # pi is pigpio.pi() or a FakeGPIO, the buttons of Board call its call_... methods
+   global TickSource
+   TickSource = pi                             # TickToNow reads the current tick from it
+   Board.resetTicks = pi.get_current_tick() #initializing var
+
+   for name, i in Board.Buttons.items():
+      pi.set_pull_up_down(i, PUD_UP)              # We use the RasPI built-in Pull-Up/Down resistors...
+      pi.set_mode(i, INPUT)                       # all buttons are inputs...
+      pi.set_glitch_filter(i, GlitchFilter[name]) # glitch filter of 0.1 sec. This will ignore every input level change (low-high-low or high-low-high) that is
+                                                  # happening faster than within 0.1 sec. This way of "debouncing" is so much more powerful than RPi.GPIOs "bouncetime" !
+                                                  # If you ever had problems detecting the state of your push buttons in your RasPI Projects, try using pigpio!!!
+                                                  # The big Push-Buttons are debounced in software instead, see Debouncer
+
+   pi.callback(Board.Buttons["increment"], EITHER_EDGE, Board.call_increment)       # now we define the callback functions for the various button events
+   pi.callback(Board.Buttons["minutes"], EITHER_EDGE, Board.call_minutes)
+   pi.callback(Board.Buttons["start"], EITHER_EDGE, Board.call_start)
+   pi.callback(Board.Buttons["reset"], EITHER_EDGE, Board.call_reset)
+   pi.callback(Board.Buttons["green"], EITHER_EDGE, Board.call_button_green)
+   pi.callback(Board.Buttons["red"], EITHER_EDGE, Board.call_button_red)
 
 # now comes the LED strip configuration:
-LED_COUNT      = 172      # Number of LED pixels.
+LED_COUNT      = 172      # Number of LED pixels (of one board, set from the layout).
 LED_PIN        = 18      # GPIO pin connected to the pixels (must support PWM!).
 LED_FREQ_HZ    = 800000  # LED signal frequency in hertz (usually 800khz)
 LED_DMA        = 10      # DMA channel to use for generating signal (try 10)
 LED_BRIGHTNESS = 255     # Set to 0 for darkest and 255 for brightest
 LED_INVERT     = False   # True to invert the signal (when using NPN transistor level shift)
 LED_CHANNEL    = 0
-LED_STRIP      = ws.SK6812_STRIP_RGBW
-
-DotsOn = [False,False]     # Dots are off in both clocks
-DotsToggle = [False,False] # Dots will not start blinking with Toggle == False
-
-ShowSymbols = [False,False]    # If Symbols insted of the Time must be displayed, these Symbols must be placed into this var
-
-TimeRed = 0   # Time to be shown on the "RED" Display
-TimeGreen = 0 # Time to be shown on the "GREEN" Display
-
-DisplayColor = [[0,0,0,255],[0,0,0,255]] # color to be used in Green and Red Display
-
-# Every 7-Segment display is housing 21 SK6812 "pixels" (3 per segment). The "Digits" matrix
-# defines which pixels must be lit up to show the digits 0-9
-Digits = [[1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 1, 1],        # digit "0"
-          [1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0, 0],        # digit "1"
-          [0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0],        # ...
-          [1, 1, 1, 1, 1, 1, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0],
-          [1, 1, 1, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 0, 0, 0, 1, 1, 1],
-          [1, 1, 1, 1, 1, 1, 0, 0, 0, 1, 1, 1, 0, 0, 0, 1, 1, 1, 1, 1, 1],
-          [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 1, 1, 1, 1, 1, 1],
-          [1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 0, 0, 0],
-          [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
-          [1, 1, 1, 1, 1, 1, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1]]        # digit "9"
-
-# And there are a number of Symbols.... 
-Symbols = {"-": [0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-           "C": [0, 0, 0, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1],
-           "E": [0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 1, 1, 1, 1, 1, 1],
-           "G": [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 1, 1, 1, 1, 1, 1],
-           "H": [1, 1, 1, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 1, 1, 1],
-           "S": [1, 1, 1, 1, 1, 1, 0, 0, 0, 1, 1, 1, 0, 0, 0, 1, 1, 1, 1, 1, 1]}
-
-NumberBases = [0,21,44,65,86,107,130,151]  # defines at which Pixel the 7-Segments Displays "start" - e.g. 4th Display starts at Pixel 65...
-DotsBases = [42,128] # Theses are the startpixel for the Dots that separate Minutes from Seconds
-
-def ShowDots():
-    global DotsOn
-    global DotsToggle
-    global DotsBases
-    for i in range(0,2):
-       strip.setPixelColor(DotsBases[i], Color(DisplayColor[i][0]*int(DotsOn[i]), DisplayColor[i][1]*int(DotsOn[i]), DisplayColor[i][2]*int(DotsOn[i]), DisplayColor[i][3]*int(DotsOn[i])))
-       strip.setPixelColor(DotsBases[i]+1, Color(DisplayColor[i][0]*int(DotsOn[i]), DisplayColor[i][1]*int(DotsOn[i]), DisplayColor[i][2]*int(DotsOn[i]), DisplayColor[i][3]*int(DotsOn[i])))
-       if DotsToggle[i]:
-          DotsOn[i] = not(DotsOn[i])
-    strip.show()
-
-def displayDigit(On, Number):
-     for i in range(len(Digits[Number])):
-         strip.setPixelColor(NumberBases[On]+i, Color(DisplayColor[On//4][0]*Digits[Number][i], DisplayColor[On//4][1]*Digits[Number][i], DisplayColor[On//4][2]*Digits[Number][i], DisplayColor[On//4][3]*Digits[Number][i]))
-     strip.show()
-
-def displayChar(On, Sym):
-     for i in range(len(Symbols[Sym])):
-         strip.setPixelColor(NumberBases[On]+i, Color(DisplayColor[On//4][0]*Symbols[Sym][i], DisplayColor[On//4][1]*Symbols[Sym][i], DisplayColor[On//4][2]*Symbols[Sym][i], DisplayColor[On//4][3]*Symbols[Sym][i]))
-     strip.show()
-
-def displaySymbol(Display,String):
-     d3 = list(String)[3]
-     d2 = list(String)[2]
-     d1 = list(String)[1]
-     d0 = list(String)[0]
-
-     displayChar(Display*4+3,d3)
-     displayChar(Display*4+2,d2)
-     displayChar(Display*4+1,d1)
-     displayChar(Display*4+0,d0)
-
-def displayNumber(Display,Time):
-     Number = int(Time)
-     d3 = Number//600
-     d2 = Number//60 - 10*d3
-     d1 = (Number - (10*d3+d2)*60)//10
-     d0 = Number%10
-     
-     displayDigit(Display*4+3,d3)
-     displayDigit(Display*4+2,d2)
-     displayDigit(Display*4+1,d1)
-     displayDigit(Display*4+0,d0)
-
-def ShowClocks():
-    if ShowSymbols[DisplayRed]:
-       displaySymbol(DisplayRed,ShowSymbols[DisplayRed])
-    else: 
-       displayNumber(DisplayRed,TimeRed)
-    if ShowSymbols[DisplayGreen]:
-       displaySymbol(DisplayGreen,ShowSymbols[DisplayGreen])
-    else: 
-       displayNumber(DisplayGreen,TimeGreen)
-    # print ("R G N", TimeRed, TimeGreen, datetime.now())
-
-def DecrementClocks(): # This function is called once every 100ms and will dec the Red or the Green Clock by 100 ms
-    global TimeRed
-    global TimeGreen
-    global DisplayColor
-    global DotsOn
-    global DotsToggle
-    global ShowSymbols
-    if Game_Running:
-       print ("Game Running")
-       if CurrentState == 4:                                           # Stop Green, Run Red
-          TimeRed -= 0.1                                               # decrement by 100ms
-          if TimeRed < 0.1*(MinuteMode * 60 + 40 * IncrementMode):     # less then 10% of time is left on the clock
-             DisplayColor[DisplayRed] = [0,255,0,0]                    # Clock will turn red
-          else:
-             DisplayColor[DisplayRed] = [0,0,0,255]                    # default color is white
-          if TimeRed <= 0:                                              # Time is up for red...
-             ShowSymbols[DisplayRed] = '----'                          # show the hyphen
-             DotsOn[DisplayRed] = True
-             DotsToggle[DisplayRed] = True
-       elif CurrentState == 5:                                         # Stop Red, Run Green
-          TimeGreen -= 0.1                                             # decrement by 100ms
-          if TimeGreen < 0.1*(MinuteMode * 60 + 40 * IncrementMode):   # less then 10% of time is left on the clock
-             DisplayColor[DisplayGreen] = [0,255,0,0]                  # Clock will turn red
-          else:
-             DisplayColor[DisplayGreen] = [0,0,0,255]                  # default color is white
-          if TimeGreen <= 0:                                            # Time is up for green...
-             ShowSymbols[DisplayGreen] = '----'                        # show the hyphen
-             DotsOn[DisplayGreen] = True
-             DotsToggle[DisplayGreen] = True 
-
-def ActionLoopMinutes(): # State 1
-    global ShowSymbols
-    global MinuteIndex
-    global MinuteMode
-    global DotsOn
-    global DotsToggle
-    global TimeRed
-    global TimeGreen
-    global DisplayColor
-    print ("Old: ", MinuteMode)
-    ShowSymbols=[False,False]           # Show no Symbols but Numbers - back to default
-    DisplayColor = [[0,0,0,255],[0,0,0,255]]  # reset DisplayColors to default values
-    if FormerState == CurrentState:     # show current mode if State is entered
-      MinuteIndex += 1                  # start looping on repetitive Button press
-    MinuteIndex = MinuteIndex % len(MinuteModes)
-    MinuteMode = MinuteModes[MinuteIndex]
-    print ("F C I M: ", FormerState, CurrentState, MinuteIndex, MinuteMode)
-    TimeRed = MinuteMode * 60
-    TimeGreen = IncrementMode
-    DotsOn[DisplayGreen]=False
-    DotsToggle[DisplayGreen]=False
-    DotsOn[DisplayRed]=True
-    DotsToggle[DisplayRed]=True   # Turn on Display Red and start blinking
-
-def ActionLoopIncrement(): # State 2
-    global IncrementIndex
-    global IncrementMode
-    global DotsOn
-    global DotsToggle
-    global TimeRed
-    global TimeGreen
-    print ("Old: ", IncrementMode)
-    if FormerState == CurrentState:  # show current mode if State is entered
-       IncrementIndex += 1           # start looping on repetitive Button press
-    IncrementIndex = IncrementIndex % len(IncrementModes)
-    IncrementMode = IncrementModes[IncrementIndex]
-    print ("F C I I: ", FormerState, CurrentState, IncrementIndex, IncrementMode)
-    TimeGreen = IncrementMode
-    TimeRed = MinuteMode * 60
-    DotsOn[DisplayGreen]=True
-    DotsToggle[DisplayGreen]=True
-    DotsOn[DisplayRed]=False
-    DotsToggle[DisplayRed]=False
-
-def ActionPrestart(): # State 3
-    global TimeRed
-    global TimeGreen
-    global DotsOn
-    global DotsToggle
-    if FormerState == CurrentState: # just exit on same state
-       return
-    print ("F C M: ", FormerState, CurrentState, MinuteMode)
-    TimeRed = MinuteMode * 60
-    TimeGreen = MinuteMode * 60
-    DotsOn[DisplayGreen]=True
-    DotsToggle[DisplayGreen]=True
-    DotsOn[DisplayRed]=True
-    DotsToggle[DisplayRed]=True
-
-def ActionStopGreenRunRed(): # State 4
-    global TimeRed
-    global DotsOn
-    global DotsToggle
-    global Start_Time
-    global Game_Running
-    print ("F C R", FormerState, CurrentState, Game_Running)
-    if FormerState == 3: 
-       # The game is started (we would not be here or in this state if not...)
-       Game_Running = True
-       Start_Time = time.time()
-    if ( (FormerState != CurrentState) and (TimeRed > 0) ) :
-       TimeRed += IncrementMode                                   # Red Player gets the increment for this move, but not if timeout occured before...
-    if FormerState == 6:
-       TimeRed -= IncrementMode  # No Increment after Pause
-       Game_Running = True
-    if TimeRed >= 0.1*(MinuteMode * 60 + 40 * IncrementMode):     # more than 10% of the time left 
-       DisplayColor[DisplayRed] = [0,0,0,255]                     # Switch Color to White again
-    DotsOn[DisplayGreen]=False
-    DotsToggle[DisplayGreen]=False
-    DotsOn[DisplayRed]=True
-    DotsToggle[DisplayRed]=True
-    print ("Stop Green, Run Red")
-
-def ActionStopRedRunGreen(): # State 5
-    global TimeGreen
-    global DotsOn
-    global DotsToggle
-    global Start_Time
-    global Game_Running
-    if FormerState == 3:
-       # The game is started (we would not be in here / this state if not...)
-       Game_Running = True
-       Start_Time = time.time()
-    if ( (FormerState != CurrentState) and (TimeGreen > 0) ) :
-       TimeGreen += IncrementMode                                   # Green Player gets the increment for this move, but not if timeout occured before...
-    if FormerState == 7:
-       TimeGreen -= IncrementMode  # No Increment after Pause
-       Game_Running = True
-    if TimeGreen >= 0.1*(MinuteMode * 60 + 40 * IncrementMode):     # more than 10% of the time left
-       DisplayColor[DisplayGreen] = [0,0,0,255]                     # Switch Color to White again
-    DotsOn[DisplayGreen]=True
-    DotsToggle[DisplayGreen]=True
-    DotsOn[DisplayRed]=False
-    DotsToggle[DisplayRed]=False
-
-    print ("Stop Red Run Green")
-
-def ActionPauseGreen(): # State 6
-    global Game_Running
-    Game_Running = False
-
-def ActionPauseRed(): # State 7
-    global Game_Running
-    Game_Running = False
-
-def ActionReboot():   # State 8
-    print("rebooting")
-    os.system('sudo shutdown -r now')
-
-def ActionShutdown(): # State 9 
-    print("shutting down")
-    os.system('sudo shutdown -h now')
+LED_STRIP      = "SK6812_STRIP_RGBW"  # strip type (name of the constant in rpi_ws281x)
+LED_BITS       = 32      # bits per pixel on the wire (RGBW)
+LED_RESET      = 0.00008 # seconds of reset/latch time after every frame
 
-FunctionSwitcher = {
-        1: ActionLoopMinutes,
-        2: ActionLoopIncrement,
-        3: ActionPrestart,
-        4: ActionStopGreenRunRed,
-        5: ActionStopRedRunGreen,
-        6: ActionPauseGreen,
-        7: ActionPauseRed,
-        8: ActionReboot,
-        9: ActionShutdown,
+# Boards on one Pi: LED channel and buttons of every board, "g-c-c.py --boards N" uses the first N. The boards on
+# the same channel are chained on one strip, every board gets the next LED_COUNT pixels.
+# All boards are on LED_CHANNEL: rpi_ws281x drives both PWM channels from one PWM block and one DMA stream, so the
+# second channel needs one ws2811_t (and one render) for both channels - a second Adafruit_NeoPixel would
+# reinitialise the PWM block of the first one. Until that is built and tested on a Pi the boards are chained.
+BoardSetups = [(LED_CHANNEL, ButtonSets[0]),
+               (LED_CHANNEL, ButtonSets[1]),
+               (LED_CHANNEL, ButtonSets[2])]
+
+# The clock talks to the hardware only through a backend: the HardwareBackend is the real Raspberry Pi, the
+# SimulatedBackend runs everything in-process, so the state machine, timekeeping and rendering can be run and
+# profiled on any Linux machine.
+class HardwareBackend:
+    def gpio(self):
+        return pigpio.pi() # Connect to local Pi.
+
+    def strip(self, Channel=LED_CHANNEL, Count=LED_COUNT):
+        # Create NeoPixel object with appropriate configuration.
+        strip = Adafruit_NeoPixel(Count, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, LED_BRIGHTNESS, Channel, getattr(ws, LED_STRIP))
+        # Intialize the library (must be called once before other functions).
+        strip.begin()
+        return strip
+
+# A LED strip that records every show() with its pixels and the time the frame needs on the wire
+class FakeStrip:
+    def __init__(self, Count, Frequency=LED_FREQ_HZ, Realtime=False, History=None):
+        self.Pixels = array('I', [0] * Count)
+        self.WireTime = Count * LED_BITS / float(Frequency) + LED_RESET   # 172 RGBW pixels at 800 kHz: ~7 ms
+        self.Realtime = Realtime      # True: show() blocks for the wire time like the real DMA transfer
+        self.Shows = deque(maxlen=History)   # (Now(), pixels, wire time) for every show()
+        self.ShowCount = 0
+
+    def begin(self):
+        pass
+
+    def numPixels(self):
+        return len(self.Pixels)
+
+    def setPixelColor(self, n, color):
+        self.Pixels[n] = color
+
+    def getPixelColor(self, n):
+        return self.Pixels[n]
+
+    def show(self):
+        self.Shows.append((Now(), self.Pixels[:], self.WireTime))
+        self.ShowCount += 1
+        if self.Realtime:
+            time.sleep(self.WireTime)
+
+# Buttons without a Raspberry Pi: inject() fires the callbacks of a pin like pigpio does, with synthetic ticks
+class FakeGPIO:
+    def __init__(self):
+        self.Tick = 0
+        self.Levels = {}
+        self.GlitchFilter = {}
+        self.Callbacks = []
+
+    def get_current_tick(self):
+        return self.Tick
+
+    def set_mode(self, gpio, mode):
+        self.Levels.setdefault(gpio, 1)
+
+    def set_pull_up_down(self, gpio, pud):
+        self.Levels[gpio] = 1 if pud == PUD_UP else 0
+
+    def set_glitch_filter(self, gpio, steady):
+        self.GlitchFilter[gpio] = steady
+
+    def callback(self, gpio, edge, func):
+        self.Callbacks.append((gpio, edge, func))
+
+    def advance(self, us): # let synthetic time pass
+        self.Tick = (self.Tick + int(us)) & 0xffffffff
+
+    def inject(self, gpio, level, tick=None): # an edge on gpio to level (0 = pressed)
+        if tick is None:
+            tick = self.Tick
+        self.Levels[gpio] = level
+        for pin, edge, func in self.Callbacks:
+            if pin == gpio and (edge == EITHER_EDGE or edge == FALLING_EDGE and level == 0 or edge == RISING_EDGE and level == 1):
+                func(gpio, level, tick)
+
+    def press(self, gpio, us=100000): # press the button for us microseconds
+        self.inject(gpio, 0)
+        self.advance(us)
+        self.inject(gpio, 1)
+
+class SimulatedBackend:
+    def __init__(self, Realtime=True):
+        self.Realtime = Realtime
+
+    def gpio(self):
+        return FakeGPIO()
+
+    def strip(self, Channel=LED_CHANNEL, Count=LED_COUNT):
+        return FakeStrip(Count, LED_FREQ_HZ, self.Realtime, History=100)
+
+# Every 7-Segment display is housing 7 segments of SK6812 "pixels" (3 per segment in the original clock). The
+# segments are named like on every 7-segment display (a = top, b = top right, ... g = middle), "Digits" lists the
+# segments that must be lit up to show the digits 0-9
+Digits = ["abcdef",    # digit "0"
+          "bc",        # digit "1"
+          "abdeg",     # ...
+          "abcdg",
+          "bcfg",
+          "acdfg",
+          "acdefg",
+          "abc",
+          "abcdefg",
+          "abcdfg"]    # digit "9"
+
+# And there are a number of Symbols.... (" " is a dark digit)
+Symbols = {"-": "g",
+           "C": "adef",
+           "E": "adefg",
+           "G": "acdefg",
+           "H": "bcefg",
+           "S": "acdfg",
+           " ": ""}
+
+# The layout of the LEDs of one board is a description (a JSON file, see --layout) with the keys of DefaultLayout -
+# the layout of the original clock. Missing keys keep their default. It is compiled once at startup into a Layout:
+# the bit masks of all glyphs (see CompileGlyphs) and, per display, the first pixel of every digit and of the Dots.
+# Displays are listed by their index (DisplayGreen, DisplayRed), their digits from the rightmost one (seconds) on.
+LayoutFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "g-c-c.layout")   # used if it exists
+DefaultLayout = {
+    "pixels": 172,                # pixels of one board
+    "segment_pixels": 3,          # pixels per segment
+    "segment_order": "cdegbaf",   # the segments of a digit in the order they are wired
+    "dots_pixels": 2,             # pixels of the Dots that separate Minutes from Seconds
+    "displays": [{"digits": [0, 21, 44, 65], "dots": [42]},        # first pixel of every digit and of the Dots
+                 {"digits": [86, 107, 130, 151], "dots": [128]}],  # a display may also have an "hours" digit (h:mm:ss)
+    "tenths_below": 0,            # below this many seconds the clock shows seconds and tenths (0 = never)
 }
+TenthsStates = [3,4,5,6,7]    # tenths only in a game: in the setup states (1, 2) the green display shows the increment
+
+class Layout:
+    def __init__(self, Description):
+        d = dict(DefaultLayout)
+        for key in Description:
+            if key not in d:
+                raise ValueError("unknown layout key %r" % key)
+            d[key] = Description[key]
+        self.Count = d["pixels"]
+        self.SegmentPixels = d["segment_pixels"]
+        self.SegmentOrder = d["segment_order"]
+        self.DotsPixels = d["dots_pixels"]
+        self.TenthsBelow = d["tenths_below"]
+        self.Digits = [list(display["digits"]) for display in d["displays"]]   # per display: first pixel of every digit, rightmost first
+        self.Hours = [display.get("hours") for display in d["displays"]]       # per display: first pixel of the hours digit or None
+        self.Dots = [list(display.get("dots", [])) for display in d["displays"]]
+        if sorted(self.SegmentOrder) != list("abcdefg"):
+            raise ValueError("segment_order must name each of the segments a-g once")
+        if len(self.Digits) != 2 or min(len(digits) for digits in self.Digits) < 3:
+            raise ValueError("a layout needs 2 displays with at least 3 digits each")
+        used = []
+        for n in range(2):
+            used += [(base, base + 7 * self.SegmentPixels) for base in self.Digits[n] + [h for h in [self.Hours[n]] if h is not None]]
+            used += [(base, base + self.DotsPixels) for base in self.Dots[n]]
+        used.sort()
+        for i in range(len(used)):
+            if used[i][0] < 0 or used[i][1] > self.Count or i and used[i][0] < used[i - 1][1]:
+                raise ValueError("layout pixels %d-%d overlap or are not on the strip" % (used[i][0], used[i][1] - 1))
+
+def LoadLayout(Path): # the compiled Layout of the JSON file Path
+    with open(Path) as f:
+        return Layout(json.load(f))
+
+layout = Layout({})   # the layout of all boards (see __main__)
+
+# Digits and Symbols are compiled once at startup: every glyph (the digits 0-9, the symbol characters and ":" for
+# the Dots) becomes a bit mask of its lit pixels. For every combination of glyph and colour that is drawn we keep
+# the finished run of 32 bit pixel colours, so drawing a digit is a single copy into the pixel buffer instead of
+# building 21 Color() values one by one.
+GlyphMasks = {}   # glyph -> (bit mask of lit pixels, number of pixels)
+GlyphRuns = {}    # (glyph, colour) -> array('I') with the packed colour of every pixel of the glyph
+
+def SegmentMask(Segments): # bit mask of the pixels of these segments in a digit of the layout
+    mask = 0
+    for n in range(len(layout.SegmentOrder)):
+        if layout.SegmentOrder[n] in Segments:
+            mask |= ((1 << layout.SegmentPixels) - 1) << (n * layout.SegmentPixels)
+    return mask
+
+def CompileGlyphs(): # (again) after the layout was loaded
+    GlyphMasks.clear()
+    GlyphRuns.clear()
+    for Number in range(len(Digits)):
+        GlyphMasks[Number] = (SegmentMask(Digits[Number]), 7 * layout.SegmentPixels)
+    for Sym in Symbols:
+        GlyphMasks[Sym] = (SegmentMask(Symbols[Sym]), 7 * layout.SegmentPixels)
+    GlyphMasks[":"] = ((1 << layout.DotsPixels) - 1, layout.DotsPixels)
+
+def GlyphRun(Glyph, Colour):
+    key = (Glyph, Colour[0], Colour[1], Colour[2], Colour[3])
+    run = GlyphRuns.get(key)
+    if run is None:
+        mask, length = GlyphMasks[Glyph]
+        c = Color(Colour[0], Colour[1], Colour[2], Colour[3])
+        run = array('I', [c if mask >> i & 1 else 0 for i in range(length)])
+        GlyphRuns[key] = run
+    return run
+
+CompileGlyphs()
+
+DotsOff = [0,0,0,0]  # colour of the Dots while they are off
+
+# Timing instrumentation: how late every frame starts (that is the loop lag of DecrementClocks, ShowDots and ShowClocks,
+# which run in the frame) and how long every part of it and every strip.show() takes. Each value goes into a Histogram
+# that keeps only the last HistogramSize samples, so memory is fixed; the percentiles are only computed when the stats
+# are dumped (kill -USR1 <pid>). Recording a sample is one array store, so the overhead stays far below 1%.
+Timer = time.perf_counter   # measures how long the code takes (always real time, also in the simulator)
+HistogramSize = 1024        # samples kept per histogram
+LagWarning = 0.05           # seconds a frame may be late while a game is running before we log a warning
+
+class Histogram:
+    def __init__(self, Size=HistogramSize):
+        self.Samples = array('d', [0.0] * Size)
+        self.Count = 0
+        self.Max = 0.0
+
+    def add(self, value):
+        self.Samples[self.Count % len(self.Samples)] = value
+        self.Count += 1
+        if value > self.Max:
+            self.Max = value
+
+    def percentiles(self, *ps): # values of the given percentiles over the kept samples
+        samples = sorted(self.Samples[:min(self.Count, len(self.Samples))])
+        if not samples:
+            return [0.0 for p in ps]
+        return [samples[min(len(samples) - 1, int(len(samples) * p / 100.0))] for p in ps]
+
+    def describe(self): # in milliseconds
+        p50, p90, p99 = self.percentiles(50, 90, 99)
+        return "n=%d p50=%.3f p90=%.3f p99=%.3f max=%.3f ms" % (self.Count, p50 * 1000, p90 * 1000, p99 * 1000, self.Max * 1000)
 
-def doAction(Current,Action):
-    global StateTable
-    global FormerState
-    global CurrentState
-    global FunctionSwitcher
-    print ("Action " , Action, " Current State ", Current, "New State ", StateTable[Current-1][Action-1])
-    if Action == 0: 
+Timings = {}    # name -> Histogram
+
+def Timing(name): # the Histogram for name
+    h = Timings.get(name)
+    if h is None:
+        h = Timings[name] = Histogram()
+    return h
+
+# All drawing goes into this framebuffer instead of directly to the strip. Pushing the whole strip
+# takes several ms at 800 kHz, so we build the complete frame in memory first and only hand it over
+# once per frame - and only if at least one pixel really changed since the last frame.
+# Every run that really changes pixels is remembered as a dirty range, and only these ranges are compared,
+# handed to the strip and mirrored - so the cost of a frame grows with the changed pixels, not with the strip.
+# strip.show() is a blocking DMA call, so it does not run on the reactor thread at all: show() just
+# publishes a copy of the frame and returns at once, a render thread sends it to the strip. If the
+# strip is still busy when the next frame is published, the older one is dropped - the render thread
+# always sends the newest complete frame and never falls behind.
+# There is one FrameBuffer (and one render thread) per LED channel, shared by all boards on that channel.
+class FrameBuffer:
+    def __init__(self, Strip, Count, Channel=LED_CHANNEL):
+        self.Strip = Strip
+        self.Channel = Channel
+        self.Pixels = array('I', [0] * Count)  # the frame we are drawing right now (reactor thread)
+        self.Dirty = [(0, Count)]     # (start, end) of the pixels changed since the last frame - the strip is unknown at first
+        self.Pending = None           # (pixels, dirty ranges) of the newest frame the render thread has not picked up yet
+        self.Lock = threading.Condition()
+        self.FramesSent = 0
+        self.FramesSkipped = 0
+        self.FramesDropped = 0
+        self.ShowTiming = Timing("strip.show")
+
+    def setPixelColor(self, n, color):  # same call as on the strip, so the glyph code does not care
+        if self.Pixels[n] != color:
+            self.Pixels[n] = color
+            self.Dirty.append((n, n + 1))
+
+    def setPixels(self, n, run): # copy a whole run of pixels (see GlyphRun) starting at pixel n
+        end = n + len(run)
+        if self.Pixels[n:end] != run:
+            self.Pixels[n:end] = run
+            self.Dirty.append((n, end))
+
+    def start(self):
+        worker = threading.Thread(target=self.render, name="render")
+        worker.daemon = True
+        worker.start()
+
+    def show(self): # reactor thread, never waits for the strip
+        if not self.Dirty:
+            self.FramesSkipped += 1   # nothing to do, the strip already shows (or will show) this frame
+            return
+        pixels = self.Pixels[:]
+        dirty = self.Dirty
+        self.Dirty = []
+        with self.Lock:
+            if self.Pending is not None:
+                self.FramesDropped += 1   # the strip was too slow for the last frame, it is replaced by this one
+                dirty = self.Pending[1] + dirty   # ... but its changes must still reach the strip
+            self.Pending = (pixels, dirty)
+            self.Lock.notify()
+
+    def render(self): # render thread
+        while True:
+            with self.Lock:
+                while self.Pending is None:
+                    self.Lock.wait()
+                pixels, dirty = self.Pending
+                self.Pending = None
+            self.send(pixels, dirty)
+
+    def sendPending(self): # without a render thread (e.g. in the simulator): send the published frame, if any
+        with self.Lock:
+            pending = self.Pending
+            self.Pending = None
+        if pending is not None:
+            self.send(*pending)
+
+    def send(self, pixels, Dirty):
+        setPixelColor = self.Strip.setPixelColor
+        for start, end in MergeRanges(Dirty):
+            for i in range(start, end):
+                setPixelColor(i, pixels[i])
+        t = Timer()
+        self.Strip.show()
+        self.ShowTiming.add(Timer() - t)
+        self.FramesSent += 1
+        if mirror is not None:
+            mirror.publish(self.Channel, pixels, Dirty)    # only after the strip has its frame
+
+def MergeRanges(Ranges, Gap=0): # the (start, end) pixel ranges sorted and without overlaps, ranges at most Gap pixels apart are joined
+    merged = []
+    for start, end in sorted(Ranges):
+        if merged and start <= merged[-1][1] + Gap:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+# One Giant Chess Clock: its state machine, its two clocks and its LED_COUNT pixels. A Pi can run several boards
+# (e.g. for a simul, see BoardSetups). All boards share the reactor and the FrameScheduler, and the boards on the same
+# LED channel share its FrameBuffer - every board only draws into its own pixels, starting at Offset.
+class Board:
+    def __init__(self, Number, Frame, Offset=0, Buttons=None):
+        self.Number = Number       # board number (e.g. at the hub)
+        self.Frame = Frame         # the FrameBuffer of the LED channel of this board
+        self.Offset = Offset       # first pixel of this board on its channel
+        self.Buttons = Buttons     # button name -> GPIO pin, see ButtonSets (None: no buttons, e.g. in the simulator)
+        self.DigitBases = [[Offset + n for n in digits] for digits in layout.Digits]   # per display: first pixel of every digit, rightmost first
+        self.HoursBases = [None if n is None else Offset + n for n in layout.Hours]     # per display: first pixel of the hours digit, if any
+        self.DotsBases = [[Offset + n for n in dots] for dots in layout.Dots]
+        self.Drawn = [None, None]  # per display: what displayNumber/displaySymbol drew last, it is not drawn again while that stays the same
+        self.Debounce = Debouncer(dict((Buttons[name], us) for name, us in DebounceWindow.items()) if Buttons else {})
+        self.Snapshot = None       # the Snapshot, if the game state is kept (see __main__)
+        self.MoveLog = None        # the MoveLog, if moves are recorded (see __main__)
+        self.resetTicks = 0        # tick at which Reset was pressed
+
+        self.CurrentState = 0 # no current State
+        self.FormerState = 0 # no former State
+
+        self.MinuteIndex = 0
+        self.IncrementIndex = 0
+        self.MinuteMode=MinuteModes[self.MinuteIndex]          # 1 minute Game is setup on Program startup. This will be "pushed" to 3 Min when DFA is initialized. So 3 Min game is the default
+        self.IncrementMode=IncrementModes[self.IncrementIndex] # 0 seconds increment is the default
+
+        self.Game_Running = False      # Will be set to True as soon as the Red or Green Button was pressed while in "Prestart" state -> One Clock starts "Count-Down"
+        self.Start_Time = 0
+
+        self.RunningClock = None    # DisplayRed or DisplayGreen while a clock is running, None if no clock is running
+        self.RunBase = 0            # time that was on the running clock when it was started
+        self.RunSince = 0           # Now() when the running clock was started
+        self.TransitionTime = 0     # Now() of the transition doAction is currently handling
+        self.AppliedIncrement = 0   # increment that was credited by the last transition into state 4 or 5
+        self.MoveCount = 0          # moves of the current game (transitions that switch the running side)
+
+        self.DotsOn = [False,False]     # Dots are off in both clocks
+        self.DotsToggle = [False,False] # Dots will not start blinking with Toggle == False
+
+        self.ShowSymbols = [False,False]    # If Symbols insted of the Time must be displayed, these Symbols must be placed into this var
+
+        self.TimeRed = 0   # Time to be shown on the "RED" Display
+        self.TimeGreen = 0 # Time to be shown on the "GREEN" Display
+
+        self.DisplayColor = [[0,0,0,255],[0,0,0,255]] # color to be used in Green and Red Display
+
+    # next few fuctions will define what to do, when one of the buttons is pressed (minutes, increment, start, reset, red, green)
+    # For all Buttons: level == 0 => falling edge (press button), level == 1 => rising edge (release button)
+    def call_reset(self, gpio, level, tick):
+        if not(Ignore_Button_Events):
+            if level == 0:
+                #button press - we will only act on reset release as we must keep short, long and verylong press apart
+                self.resetTicks = tick
+            elif level == 1:
+                #button release
+                diff = TickDiff(self.resetTicks, tick)
+                if diff < 5000000:
+                    #Switch pressed under 5 seconds
+                    events.post(self, ActionReset, TickToNow(tick))   # doAction will put the DFA into a new state (on the reactor thread)
+                elif diff >= 5000000 and diff < 10000000:
+                    #Switch pressed over 5 but under 10 second -> Action 9 == LongReset
+                    events.post(self, ActionLongReset, TickToNow(tick))
+                elif diff >= 10000000 :
+                    #Switch pressed over 10 second -> Action 10 == VeryLongReset
+                    events.post(self, ActionVeryLongReset, TickToNow(tick))
+
+    def call_start(self, gpio, level, tick):
+        if not(Ignore_Button_Events):
+            if level == 0:    # for all other buttons we will only act on "press" not "release"
+                Log(DEBUG, "button", board=self.Number, name="start")
+                events.post(self, ActionStartPause, TickToNow(tick))
+
+    def call_minutes(self, gpio, level, tick):
+        if not(Ignore_Button_Events):
+            if level == 0:
+                Log(DEBUG, "button", board=self.Number, name="minutes")
+                events.post(self, ActionMinutes, TickToNow(tick))
+
+    def call_increment(self, gpio, level, tick):
+        if not(Ignore_Button_Events):
+            if level == 0:
+                Log(DEBUG, "button", board=self.Number, name="increment")
+                events.post(self, ActionIncrement, TickToNow(tick))
+
+    def call_button_green(self, gpio, level, tick):
+        if not(Ignore_Button_Events) and self.Debounce.accept(gpio, tick):
+            if level == 0:
+                Log(DEBUG, "button", board=self.Number, name="green")
+                events.post(self, ActionGreenButtonPressed, TickToNow(tick, GlitchFilter["green"]), tick)   # the move ended at the first edge, not when the event is applied
+
+    def call_button_red(self, gpio, level, tick):
+        if not(Ignore_Button_Events) and self.Debounce.accept(gpio, tick):
+            if level == 0:
+                Log(DEBUG, "button", board=self.Number, name="red")
+                events.post(self, ActionRedButtonPressed, TickToNow(tick, GlitchFilter["red"]), tick)
+
+    def ShowDots(self):
+        for i in range(0,2):
+           if self.DotsOn[i]:
+              run = GlyphRun(":", self.DisplayColor[i])
+           else:
+              run = GlyphRun(":", DotsOff)
+           for base in self.DotsBases[i]:
+              self.Frame.setPixels(base, run)
+           if self.DotsToggle[i]:
+              self.DotsOn[i] = not(self.DotsOn[i])
+
+    def displaySymbol(self, Display, String): # String is shown right-aligned, all other digits stay dark
+         Colour = self.DisplayColor[Display]
+         Drawn = (String, None, Colour[0], Colour[1], Colour[2], Colour[3])
+         if Drawn == self.Drawn[Display]:
+            return
+         self.Drawn[Display] = Drawn
+         Glyphs = [String[-1 - n] if n < len(String) else " " for n in range(len(self.DigitBases[Display]))]
+         self.displayDigits(Display, Glyphs, " ")
+
+    def displayNumber(self, Display, Time):
+         Number = int(Time)
+         Tenths = int(Time * 10) % 10 if 0 <= Time < layout.TenthsBelow and self.CurrentState in TenthsStates else None
+         Colour = self.DisplayColor[Display]
+         Drawn = (Number, Tenths, Colour[0], Colour[1], Colour[2], Colour[3])
+         if Drawn == self.Drawn[Display]:
+            return                              # most frames are within the same second
+         self.Drawn[Display] = Drawn
+         Count = len(self.DigitBases[Display])
+         Hours = " "
+         if Tenths is not None:
+            Glyphs = [Tenths, Number % 10, Number // 10 or " "]   # seconds and tenths, e.g. "19:7"
+            if Count > 3:
+               Glyphs.insert(0, " ")
+         else:
+            Minutes = Number // 60
+            if self.HoursBases[Display] is not None:
+               Hours = min(9, Minutes // 60) or " "
+               Minutes = Minutes % 60
+            Glyphs = [Number % 10, Number // 10 % 6]
+            for n in range(Count - 3):
+               Glyphs.append(Minutes % 10)
+               Minutes //= 10
+            Glyphs.append(min(9, Minutes))      # more minutes than the digits can show: 9s on the leftmost digit
+         Glyphs += [" "] * (Count - len(Glyphs))
+         self.displayDigits(Display, Glyphs, Hours)
+
+    def displayDigits(self, Display, Glyphs, Hours): # draws the glyphs (digits or symbol characters, rightmost first) of Display into the framebuffer, the FrameScheduler pushes the result
+         setPixels = self.Frame.setPixels
+         Colour = self.DisplayColor[Display]
+         for base, glyph in zip(self.DigitBases[Display], Glyphs):
+            setPixels(base, GlyphRun(glyph, Colour))
+         if self.HoursBases[Display] is not None:
+            setPixels(self.HoursBases[Display], GlyphRun(Hours, Colour))
+
+    def ShowClocks(self): # draws all 8 digits, the FrameScheduler pushes the frames of all boards once per channel
+        if self.ShowSymbols[DisplayRed]:
+           self.displaySymbol(DisplayRed,self.ShowSymbols[DisplayRed])
+        else:
+           self.displayNumber(DisplayRed,self.TimeRed)
+        if self.ShowSymbols[DisplayGreen]:
+           self.displaySymbol(DisplayGreen,self.ShowSymbols[DisplayGreen])
+        else:
+           self.displayNumber(DisplayGreen,self.TimeGreen)
+
+    def UpdateRunningClock(self, t): # charge the running clock with the time that really passed since it was started
+        if self.RunningClock == DisplayRed:
+           self.TimeRed = self.RunBase - (t - self.RunSince)
+        elif self.RunningClock == DisplayGreen:
+           self.TimeGreen = self.RunBase - (t - self.RunSince)
+        else:
+           return
+        self.CheckClock(self.RunningClock)    # every charge updates colour and flag - also one between two frames
+
+    def StartClock(self, Display, t): # the clock of Display is running from t on
+        self.RunningClock = Display
+        if Display == DisplayRed:
+           self.RunBase = self.TimeRed
+        else:
+           self.RunBase = self.TimeGreen
+        self.RunSince = t
+
+    def StopClocks(self, t): # charge the running clock up to t and stop it
+        self.UpdateRunningClock(t)
+        self.RunningClock = None
+
+    def CheckClock(self, Display): # colour and flag of a clock that is (or was until now) running
+        if Display == DisplayRed:
+           Time = self.TimeRed
+        else:
+           Time = self.TimeGreen
+        if Time < 0.1*(self.MinuteMode * 60 + 40 * self.IncrementMode):     # less then 10% of time is left on the clock
+           self.DisplayColor[Display] = [0,255,0,0]                          # Clock will turn red
+        else:
+           self.DisplayColor[Display] = [0,0,0,255]                          # default color is white
+        if Time <= 0:                                                         # Time is up...
+           self.ShowSymbols[Display] = '----'                                # show the hyphen
+           self.DotsOn[Display] = True
+           self.DotsToggle[Display] = True
+
+    def DecrementClocks(self): # This function is called in every frame (every 100ms while a clock is running) and will update the Red or the Green Clock to the time really passed
+        if self.Game_Running:
+           Log(DEBUG, "game running", board=self.Number, red=self.TimeRed, green=self.TimeGreen)
+           self.UpdateRunningClock(Now())                                  # no matter how late we are called, the time is exact
+
+    def ActionLoopMinutes(self): # State 1
+        Log(DEBUG, "minutes", old=self.MinuteMode)
+        self.ShowSymbols=[False,False]           # Show no Symbols but Numbers - back to default
+        self.DisplayColor = [[0,0,0,255],[0,0,0,255]]  # reset DisplayColors to default values
+        if self.FormerState == self.CurrentState:     # show current mode if State is entered
+          self.MinuteIndex += 1                  # start looping on repetitive Button press
+        self.MinuteIndex = self.MinuteIndex % len(MinuteModes)
+        self.MinuteMode = MinuteModes[self.MinuteIndex]
+        Log(DEBUG, "minutes", former=self.FormerState, state=self.CurrentState, index=self.MinuteIndex, minutes=self.MinuteMode)
+        self.TimeRed = self.MinuteMode * 60
+        self.TimeGreen = self.IncrementMode
+        self.DotsOn[DisplayGreen]=False
+        self.DotsToggle[DisplayGreen]=False
+        self.DotsOn[DisplayRed]=True
+        self.DotsToggle[DisplayRed]=True   # Turn on Display Red and start blinking
+
+    def ActionLoopIncrement(self): # State 2
+        Log(DEBUG, "increment", old=self.IncrementMode)
+        if self.FormerState == self.CurrentState:  # show current mode if State is entered
+           self.IncrementIndex += 1           # start looping on repetitive Button press
+        self.IncrementIndex = self.IncrementIndex % len(IncrementModes)
+        self.IncrementMode = IncrementModes[self.IncrementIndex]
+        Log(DEBUG, "increment", former=self.FormerState, state=self.CurrentState, index=self.IncrementIndex, increment=self.IncrementMode)
+        self.TimeGreen = self.IncrementMode
+        self.TimeRed = self.MinuteMode * 60
+        self.DotsOn[DisplayGreen]=True
+        self.DotsToggle[DisplayGreen]=True
+        self.DotsOn[DisplayRed]=False
+        self.DotsToggle[DisplayRed]=False
+
+    def ActionPrestart(self): # State 3
+        if self.FormerState == self.CurrentState: # just exit on same state
+           return
+        Log(DEBUG, "prestart", former=self.FormerState, state=self.CurrentState, minutes=self.MinuteMode)
+        self.TimeRed = self.MinuteMode * 60
+        self.TimeGreen = self.MinuteMode * 60
+        self.DotsOn[DisplayGreen]=True
+        self.DotsToggle[DisplayGreen]=True
+        self.DotsOn[DisplayRed]=True
+        self.DotsToggle[DisplayRed]=True
+
+    def ActionStopGreenRunRed(self): # State 4
+        Log(DEBUG, "run red", former=self.FormerState, state=self.CurrentState, running=self.Game_Running)
+        if self.FormerState == 3:
+           # The game is started (we would not be here or in this state if not...)
+           self.Game_Running = True
+           self.Start_Time = time.time()
+        self.AppliedIncrement = 0
+        if ( (self.FormerState != self.CurrentState) and (self.TimeRed > 0) ) :
+           self.TimeRed += self.IncrementMode                              # Red Player gets the increment for this move, but not if timeout occured before...
+           self.AppliedIncrement = self.IncrementMode
+        if self.FormerState == 6:
+           self.TimeRed -= self.AppliedIncrement  # No Increment after Pause (and nothing to take back if none was credited because of a timeout)
+           self.AppliedIncrement = 0
+           self.Game_Running = True
+        if self.TimeRed >= 0.1*(self.MinuteMode * 60 + 40 * self.IncrementMode):     # more than 10% of the time left
+           self.DisplayColor[DisplayRed] = [0,0,0,255]                               # Switch Color to White again
+        self.StartClock(DisplayRed, self.TransitionTime)                            # Red is running from the moment the button was pressed
+        self.DotsOn[DisplayGreen]=False
+        self.DotsToggle[DisplayGreen]=False
+        self.DotsOn[DisplayRed]=True
+        self.DotsToggle[DisplayRed]=True
+        Log(DEBUG, "stop green, run red", red=self.TimeRed, green=self.TimeGreen)
+
+    def ActionStopRedRunGreen(self): # State 5
+        if self.FormerState == 3:
+           # The game is started (we would not be in here / this state if not...)
+           self.Game_Running = True
+           self.Start_Time = time.time()
+        self.AppliedIncrement = 0
+        if ( (self.FormerState != self.CurrentState) and (self.TimeGreen > 0) ) :
+           self.TimeGreen += self.IncrementMode                              # Green Player gets the increment for this move, but not if timeout occured before...
+           self.AppliedIncrement = self.IncrementMode
+        if self.FormerState == 7:
+           self.TimeGreen -= self.AppliedIncrement  # No Increment after Pause (and nothing to take back if none was credited because of a timeout)
+           self.AppliedIncrement = 0
+           self.Game_Running = True
+        if self.TimeGreen >= 0.1*(self.MinuteMode * 60 + 40 * self.IncrementMode):     # more than 10% of the time left
+           self.DisplayColor[DisplayGreen] = [0,0,0,255]                               # Switch Color to White again
+        self.StartClock(DisplayGreen, self.TransitionTime)                            # Green is running from the moment the button was pressed
+        self.DotsOn[DisplayGreen]=True
+        self.DotsToggle[DisplayGreen]=True
+        self.DotsOn[DisplayRed]=False
+        self.DotsToggle[DisplayRed]=False
+
+        Log(DEBUG, "stop red, run green", red=self.TimeRed, green=self.TimeGreen)
+
+    def ActionPauseGreen(self): # State 6
+        self.Game_Running = False
+
+    def ActionPauseRed(self): # State 7
+        self.Game_Running = False
+
+    def ActionReboot(self):   # State 8 - reboots the whole Pi, with all boards on it
+        Log(WARNING, "rebooting", board=self.Number)
+        eventlog.sync()      # the writer thread will not get another chance
+        SystemCommand('sudo shutdown -r now')
+
+    def ActionShutdown(self): # State 9
+        Log(WARNING, "shutting down", board=self.Number)
+        eventlog.sync()
+        SystemCommand('sudo shutdown -h now')
+
+    def doAction(self,Current,Action,When=None,Tick=None): # When is the Now() time of the button press, default is "just now". Tick is its pigpio tick
+        Log(INFO, "transition", board=self.Number, action=Action, state=Current, new=StateTable[Current-1][Action-1])
+        if Action == 0:
+            return
+        if When is None:
+            When = Now()
+        self.TransitionTime = When
+        self.StopClocks(When)      # the player who was running is charged exactly up to this transition. The new state may start a clock again
+        NewState = StateTable[Current-1][Action-1]
+        func = FunctionSwitcher.get(NewState, lambda board: "Invalid State")
+        self.FormerState = self.CurrentState
+        self.CurrentState = NewState
+        func(self)
+        if self.CurrentState == 3:
+            self.MoveCount = 0
+        elif self.CurrentState in RunningStates and self.FormerState in RunningStates and self.FormerState != self.CurrentState:
+            self.MoveCount += 1
+        if self.Snapshot is not None:
+            self.Snapshot.save(self, True)
+        if self.MoveLog is not None:
+            if Tick is None:
+                Tick = int(When * 1000000) & 0xffffffff   # no button press (e.g. simulated) - a tick in the same microseconds
+            self.LogMove(Tick)
         return
-    NewState = StateTable[Current-1][Action-1]
-    func = FunctionSwitcher.get(NewState, lambda: "Invalid State")
-    FormerState = CurrentState
-    CurrentState = NewState
-    func()
-    return
+
+    def ResumeFromSnapshot(self, record): # go into the paused state of the recovered game, True if there was a game to resume
+        if record is None or record[2] not in [4,5,6,7]:
+           return False
+        self.MinuteIndex = record[3] % len(MinuteModes)
+        self.MinuteMode = MinuteModes[self.MinuteIndex]
+        self.IncrementIndex = record[4] % len(IncrementModes)
+        self.IncrementMode = IncrementModes[self.IncrementIndex]
+        self.TimeRed = record[6]
+        self.TimeGreen = record[7]
+        self.Game_Running = False
+        if record[2] in [4,6]:
+           self.CurrentState = 6       # Pause Red: Start/Pause lets the red clock run again
+           Display = DisplayRed
+        else:
+           self.CurrentState = 7       # Pause Green
+           Display = DisplayGreen
+        self.FormerState = self.CurrentState
+        for i, t in [(DisplayRed, self.TimeRed), (DisplayGreen, self.TimeGreen)]:
+           if t < 0.1*(self.MinuteMode * 60 + 40 * self.IncrementMode):
+              self.DisplayColor[i] = [0,255,0,0]
+           if t <= 0:
+              self.ShowSymbols[i] = '----'
+        self.DotsOn[Display] = True
+        self.DotsToggle[Display] = True
+        Log(INFO, "resumed", board=self.Number, state=self.CurrentState, minutes=self.MinuteMode, increment=self.IncrementMode, red=self.TimeRed, green=self.TimeGreen)
+        return True
+
+    def LogMove(self, Tick): # called by doAction after every transition
+        if self.CurrentState not in RunningStates or self.FormerState == self.CurrentState:
+            if self.FormerState in RunningStates and self.CurrentState not in RunningStates:
+                self.MoveLog.flushLater()    # paused, reset or flag: a good moment to write what we have
+            return
+        if self.CurrentState == 4:
+            Started, Moved = DisplayRed, DisplayGreen    # Green Button: Green has moved, Red is running
+        else:
+            Started, Moved = DisplayGreen, DisplayRed
+        if self.FormerState == 3:
+            self.MoveLog.add(Tick, MoveLogStart, Started, [self.TimeGreen, self.TimeRed][Started], self.AppliedIncrement)
+        elif self.FormerState in RunningStates:
+            self.MoveLog.add(Tick, MoveLogMove, Moved, [self.TimeGreen, self.TimeRed][Moved], self.AppliedIncrement)
+
+SystemCommand = os.system   # runs the reboot/shutdown command (the simulator replaces it)
+
+FunctionSwitcher = {
+        1: Board.ActionLoopMinutes,
+        2: Board.ActionLoopIncrement,
+        3: Board.ActionPrestart,
+        4: Board.ActionStopGreenRunRed,
+        5: Board.ActionStopRedRunGreen,
+        6: Board.ActionPauseGreen,
+        7: Board.ActionPauseRed,
+        8: Board.ActionReboot,
+        9: Board.ActionShutdown,
+}
+
+boards = []     # all Boards of this Pi (see __main__)
+
+# One frame scheduler drives everything that used to be three independent LoopingCalls: in every frame the time
+# is updated first, then the dots blink (if due) and finally the whole frame is rendered - so the display can never
+# be a tick behind the clock. While a clock is running we draw FramePeriod frames, in all other states only when
+# something changes: a button was pressed or the dots have to blink.
+# With several boards all of them are updated and drawn in the same frame, and every LED channel is pushed once for
+# all boards on it - so the frame, the diff and the strip.show() are shared instead of repeated per board.
+FramePeriod = 0.1         # seconds between frames while a clock is running
+DotsPeriod = 0.5          # seconds between two toggles of the blinking dots
+RunningStates = [4,5]     # states with a running clock, all others are drawn only on change
+
+class FrameScheduler:
+    def __init__(self, Boards, Clock=reactor):  # Clock schedules the frames: the reactor or a twisted.internet.task.Clock for virtual time
+        self.Boards = Boards   # the boards to drive (the list may still be filled until start())
+        self.Buffers = []      # the FrameBuffers of these boards, one per LED channel
+        self.Clock = Clock
+        self.Call = None       # the reactor call of the next frame
+        self.Due = 0           # Now() at which the next frame should run
+        self.NextDots = 0      # Now() at which the dots toggle next
+        self.Frames = 0
+        self.Overruns = 0      # frames that finished after the next frame would have been due
+        self.LateMax = 0.0     # latest start of a frame after it was due
+        self.DurationSum = 0.0
+        self.DurationMax = 0.0
+        self.LagWarnings = 0
+        self.Lag = Timing("frame lag")
+        self.Durations = [Timing("frame"), Timing("DecrementClocks"), Timing("ShowDots"), Timing("ShowClocks")]
+
+    def start(self):
+        self.Buffers = []
+        for board in self.Boards:
+            if board.Frame not in self.Buffers:
+                self.Buffers.append(board.Frame)
+        self.NextDots = Now()
+        self.request()
+
+    def request(self): # something changed - draw a new frame as soon as possible
+        self.schedule(Now())
+
+    def schedule(self, when):
+        if self.Call is not None and self.Call.active():
+            if self.Due <= when:
+                return             # a frame is already due earlier
+            self.Call.cancel()
+        self.Due = when
+        self.Call = self.Clock.callLater(max(0, when - Now()), self.frame)
+
+    def frame(self):
+        start = Now()
+        late = start - self.Due
+        t0 = Timer()
+        running = False        # is a clock running on any board?
+        for board in self.Boards:
+            board.DecrementClocks()
+            if board.CurrentState in RunningStates:
+                running = True
+                if board.Snapshot is not None:
+                    board.Snapshot.tick(board, start)
+        t1 = Timer()
+        if start >= self.NextDots:
+            for board in self.Boards:
+                board.ShowDots()
+            self.NextDots += DotsPeriod
+            if self.NextDots <= start:
+                self.NextDots = start + DotsPeriod   # we missed a toggle - do not try to catch up
+        t2 = Timer()
+        for board in self.Boards:
+            board.ShowClocks()
+        for buffer in self.Buffers:
+            buffer.show()      # one push per LED channel for all its boards
+        t3 = Timer()
+        if hub is not None:
+            hub.update()
+        frame, decrement, dots, clocks = self.Durations
+        frame.add(t3 - t0)
+        decrement.add(t1 - t0)
+        dots.add(t2 - t1)
+        clocks.add(t3 - t2)
+        self.Lag.add(late)
+        if late > LagWarning and running:
+            self.LagWarnings += 1
+            Log(WARNING, "loop lag", ms=int(late * 1000), boards=len(self.Boards))   # the clock is falling behind
+        duration = Now() - start
+        self.Frames += 1
+        self.DurationSum += duration
+        if duration > self.DurationMax:
+            self.DurationMax = duration
+        if late > self.LateMax:
+            self.LateMax = late
+        if late + duration > FramePeriod:
+            self.Overruns += 1
+        if running:
+            due = self.Due + FramePeriod
+            while due < start + duration:
+                due += FramePeriod    # keep the phase, but skip the frames we missed instead of running them back to back
+            self.schedule(due)
+        elif any(board.DotsToggle[DisplayRed] or board.DotsToggle[DisplayGreen] for board in self.Boards):
+            self.schedule(self.NextDots)
+        # else: nothing will change until the next button event
+
+scheduler = FrameScheduler(boards)
+
+# Giant clocks get unplugged in the middle of games. So the state of the game is kept in a tiny memory mapped file:
+# two fixed size records, written alternately, each with a sequence number and a CRC. A write that is torn by a power
+# loss breaks only one record, and the other one still holds the state before. On boot we take the newest valid record
+# and go straight into the paused state with the recovered times - there is no log to replay.
+# Every transition writes and flushes a record. While a clock is running we only write it once per SnapshotPeriod
+# (that is just a memory copy) and flush it to the SD card every SnapshotFlushPeriod - no fsync on the 100ms tick.
+# The reactor only does the memory copy, the flush (an msync that waits for the SD card) runs on a thread.
+SnapshotFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "g-c-c.state")   # of the first board, see BoardFile
+SnapshotPeriod = 1.0        # seconds between two records while a clock is running
+SnapshotFlushPeriod = 10.0  # seconds between two flushes while a clock is running
+SnapshotMagic = b"GCC1"
+SnapshotRecord = struct.Struct("<4sIBBBBdd")  # magic, sequence, CurrentState, MinuteIndex, IncrementIndex, Game_Running, TimeRed, TimeGreen
+SnapshotCRC = struct.Struct("<I")
+SnapshotSlot = SnapshotRecord.size + SnapshotCRC.size
+
+class Snapshot:
+    def __init__(self, Path):
+        fd = os.open(Path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < 2 * SnapshotSlot:
+                os.ftruncate(fd, 2 * SnapshotSlot)
+            self.Map = mmap.mmap(fd, 2 * SnapshotSlot)
+        finally:
+            os.close(fd)
+        self.Sequence = 0
+        self.NextSave = 0
+        self.NextFlush = 0
+        self.FlushPending = False   # a flush is waiting for its thread
+        self.Updates = 0
+        self.CostSum = 0.0    # time spent in save()
+        self.CostMax = 0.0
+
+    def load(self): # the newest valid record as tuple (sequence, state, ...) or None
+        best = None
+        for slot in range(2):
+            data = self.Map[slot * SnapshotSlot:(slot + 1) * SnapshotSlot]
+            body = data[:SnapshotRecord.size]
+            if SnapshotCRC.unpack(data[SnapshotRecord.size:])[0] != zlib.crc32(body) & 0xffffffff:
+                continue    # torn or empty record
+            record = SnapshotRecord.unpack(body)
+            if record[0] == SnapshotMagic and (best is None or record[1] > best[1]):
+                best = record
+        if best is not None:
+            self.Sequence = best[1]
+        return best
+
+    def save(self, Board, Flush):
+        t = Now()
+        self.Sequence += 1
+        body = SnapshotRecord.pack(SnapshotMagic, self.Sequence, Board.CurrentState, Board.MinuteIndex, Board.IncrementIndex, int(Board.Game_Running), Board.TimeRed, Board.TimeGreen)
+        offset = (self.Sequence % 2) * SnapshotSlot   # never overwrite the newest valid record
+        self.Map[offset:offset + SnapshotSlot] = body + SnapshotCRC.pack(zlib.crc32(body) & 0xffffffff)
+        if Flush:
+            self.flushLater()
+            self.NextFlush = t + SnapshotFlushPeriod
+        self.NextSave = t + SnapshotPeriod
+        cost = Now() - t
+        self.Updates += 1
+        self.CostSum += cost
+        if cost > self.CostMax:
+            self.CostMax = cost
+
+    def flushLater(self): # msync on a thread, the reactor does not wait for the SD card
+        if not self.FlushPending:
+            self.FlushPending = True
+            reactor.callInThread(self.flushNow)
+
+    def flushNow(self): # thread pool: writes the newest record, whichever was saved last
+        self.FlushPending = False
+        self.Map.flush()
+
+    def tick(self, Board, t): # called in every frame while the clock of Board is running
+        if t >= self.NextSave:
+            self.save(Board, t >= self.NextFlush)
+
+def BoardFile(Path, n): # the file of the n-th board of this Pi: the first one keeps the name, e.g. g-c-c-2.state for the second
+    if n == 1:
+        return Path
+    root, ext = os.path.splitext(Path)
+    return "%s-%d%s" % (root, n, ext)
+
+# Every move (a transition that switches the running side, into state 4 or 5) is recorded in a small append-only
+# binary log. The log is a ring of fixed size records, so it never grows: the oldest games are overwritten. New
+# records are collected in memory and written in batches by the writer thread of the log - never on the reactor.
+# One thread writes all batches, so they reach the file in the order of the moves. Every record carries the low bits
+# of its number: once the ring has wrapped, a batch that was torn before its header was written has overwritten some
+# of the oldest records, and ReadMoveLog skips them because their number does not match their place.
+# "g-c-c.py --pgn" turns the games in the log into PGN with [%clk h:mm:ss] annotations and think time statistics.
+MoveLogFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "g-c-c.moves")   # of the first board, see BoardFile
+MoveLogCapacity = 4096    # records in the ring (16 bytes each)
+MoveLogBatch = 16         # records collected before they are written
+MoveLogHeader = struct.Struct("<4sII")   # magic, capacity, number of records ever written
+MoveLogEntry = struct.Struct("<IBBHii")  # pigpio tick, kind, side, record number & 0xffff, remaining time in ms, increment credited in ms
+MoveLogMagic = b"GCM2"
+MoveLogStart = 0          # kind: the game was started, side = clock that started, remaining = its time
+MoveLogMove = 1           # kind: side has moved, remaining = its time after the move, increment = credited to the opponent
+SideNames = {DisplayRed: "Red", DisplayGreen: "Green"}
+
+class MoveLog:
+    def __init__(self, Path, Capacity=MoveLogCapacity):
+        self.File = os.fdopen(os.open(Path, os.O_RDWR | os.O_CREAT, 0o644), "r+b")
+        header = self.File.read(MoveLogHeader.size)
+        if len(header) == MoveLogHeader.size and MoveLogHeader.unpack(header)[0] == MoveLogMagic:
+            self.Capacity, self.Written = MoveLogHeader.unpack(header)[1:]
+        else:
+            self.Capacity, self.Written = Capacity, 0
+        self.Pending = []     # records not handed to the writer yet (reactor thread)
+        self.Batches = deque()   # batches waiting for the writer thread, oldest first
+        self.Stopping = False
+        self.Wakeup = threading.Event()
+        self.Records = 0
+        self.Flushes = 0
+        self.Writer = threading.Thread(target=self.writer, name="moves")
+        self.Writer.daemon = True
+        self.Writer.start()
+
+    def add(self, Tick, Kind, Side, Remaining, Increment):
+        self.Pending.append((Tick, Kind, Side, int(round(Remaining * 1000)), int(round(Increment * 1000))))
+        self.Records += 1
+        if len(self.Pending) >= MoveLogBatch:
+            self.flushLater()
+
+    def flushLater(self): # hand the collected records over to the writer thread, the reactor does not wait for the SD card
+        if self.Pending:
+            self.Batches.append(self.Pending)
+            self.Pending = []
+            self.Wakeup.set()
+
+    def flush(self): # on shutdown: let the writer write everything and wait for it
+        self.flushLater()
+        self.Stopping = True
+        self.Wakeup.set()
+        self.Writer.join()
+
+    def writer(self):
+        while True:
+            self.Wakeup.wait()
+            self.Wakeup.clear()
+            stopping = self.Stopping   # read before the batches, so none that came before the stop is left behind
+            while self.Batches:
+                self.write(self.Batches.popleft())
+            if stopping:
+                return
+
+    def write(self, batch): # writer thread
+        for Tick, Kind, Side, Remaining, Increment in batch:
+            self.File.seek(MoveLogHeader.size + (self.Written % self.Capacity) * MoveLogEntry.size)
+            self.File.write(MoveLogEntry.pack(Tick, Kind, Side, self.Written & 0xffff, Remaining, Increment))
+            self.Written += 1
+        self.File.seek(0)
+        self.File.write(MoveLogHeader.pack(MoveLogMagic, self.Capacity, self.Written))   # header last: the batch counts only from now on
+        self.File.flush()
+        self.Flushes += 1
+
+def ReadMoveLog(Path): # yields the records of the log (tick, kind, side, remaining ms, increment ms), oldest first
+    with open(Path, "rb") as f:
+        magic, capacity, written = MoveLogHeader.unpack(f.read(MoveLogHeader.size))
+        if magic != MoveLogMagic:
+            return
+        first = max(0, written - capacity)
+        for n in range(first, written):
+            f.seek(MoveLogHeader.size + (n % capacity) * MoveLogEntry.size)
+            Tick, Kind, Side, Number, Remaining, Increment = MoveLogEntry.unpack(f.read(MoveLogEntry.size))
+            if Number == n & 0xffff:   # else overwritten by a newer batch that was torn before its header
+                yield Tick, Kind, Side, Remaining, Increment
+
+def FormatClock(ms): # h:mm:ss as used by [%clk]
+    seconds = max(0, ms) // 1000
+    return "%d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+def ExportPGN(Records, out): # writes one PGN game per game in the log. Moves are unknown to a clock, so they are "--"
+    game = None
+    for Tick, Kind, Side, Remaining, Increment in Records:
+        if Kind == MoveLogStart:
+            if game is not None:
+                WritePGN(game, out)
+            base = Remaining - Increment
+            game = {"White": Side, "Base": base, "Increment": Increment, "Moves": [],
+                    "Clock": {Side: Remaining, 1 - Side: base},       # time on the clock when its last move started
+                    "Last": {Side: Remaining, 1 - Side: base}}        # time on the clock after its last move
+        elif game is not None:
+            think = game["Clock"][Side] - Remaining
+            game["Moves"].append((Side, Remaining, think))
+            game["Last"][Side] = Remaining
+            game["Clock"][1 - Side] = game["Last"][1 - Side] + Increment
+    if game is not None:
+        WritePGN(game, out)
+
+def WritePGN(game, out):
+    white = game["White"]
+    out.write('[Event "Giant Chess Clock"]\n[Site "?"]\n[Date "????.??.??"]\n[Round "?"]\n')
+    out.write('[White "%s"]\n[Black "%s"]\n[Result "*"]\n' % (SideNames[white], SideNames[1 - white]))
+    out.write('[TimeControl "%d+%d"]\n\n' % (game["Base"] // 1000, game["Increment"] // 1000))
+    text = []
+    for n in range(len(game["Moves"])):
+        Side, Remaining, think = game["Moves"][n]
+        if n % 2 == 0:
+            text.append("%d." % (n // 2 + 1))
+        text.append("-- {[%%clk %s]}" % FormatClock(Remaining))
+    for side in [white, 1 - white]:
+        thinks = [m[2] for m in game["Moves"] if m[0] == side]
+        if thinks:
+            text.append("{%s: %d moves, think time avg %.1fs, min %.1fs, max %.1fs}" % (SideNames[side], len(thinks), sum(thinks) / 1000.0 / len(thinks), min(thinks) / 1000.0, max(thinks) / 1000.0))
+    text.append("*")
+    line = ""
+    for word in text:      # PGN lines should not be longer than 80 characters
+        if line and len(line) + 1 + len(word) > 79:
+            out.write(line + "\n")
+            line = word
+        else:
+            line = line + " " + word if line else word
+    out.write(line + "\n\n")
+
+# At tournaments several clocks run side by side: with --hub every clock sends the state of its boards to the hub
+# (g-c-c-hub.py) over TCP, which shows all boards to the arbiter. update() runs in every frame and sends a record
+# only when the board changed - so the frame rate (FramePeriod while a clock is running) limits the records. The
+# timing loop never waits for the hub: without a connection, or while the connection cannot take more data (Twisted
+# pauses us as a producer), records are simply not sent - the next one carries the newest state anyway.
+# Every connection starts with a HubHello that carries the token of the hub (--hub-token); the hub closes connections
+# without the right one, so nobody else on the network can write board states.
+HubPort = 7421
+HubHello = struct.Struct("!4sH")        # HubMagic, length of the token - followed by the token
+HubMagic = b"GCCH"
+HubRecord = struct.Struct("!HHBBiiH")   # board, sequence, CurrentState, flags, TimeRed in ms, TimeGreen in ms, MoveCount
+HubFlagRed = 1         # flags: red is out of time
+HubFlagGreen = 2       # green is out of time
+HubGameRunning = 4
+
+class HubConnection(Protocol):
+    def connectionMade(self):
+        self.transport.write(HubHello.pack(HubMagic, len(self.factory.Token)) + self.factory.Token)
+        self.factory.Connection = self
+        self.factory.Paused = False
+        self.factory.Last = {}         # send the complete state first
+        self.transport.registerProducer(self, True)
+        Log(INFO, "hub connected", boards=len(self.factory.Boards))
+
+    def connectionLost(self, reason):
+        self.factory.Connection = None
+        Log(WARNING, "hub connection lost", boards=len(self.factory.Boards))
+
+    def pauseProducing(self):  # the connection is full - drop records until it has room again
+        self.factory.Paused = True
+
+    def resumeProducing(self):
+        self.factory.Paused = False
+
+    def stopProducing(self):
+        pass
+
+class HubClient(ReconnectingClientFactory):
+    protocol = HubConnection
+    maxDelay = 10              # seconds between two connection attempts at most
+
+    def __init__(self, Boards, Token):
+        self.Boards = Boards   # all boards of this clock, each one is reported under its Number
+        self.Token = Token     # (bytes) the hub only takes records after this token
+        self.Connection = None
+        self.Paused = False
+        self.Last = {}         # board number -> the last record that was sent for it
+        self.Sequence = 0
+        self.Sent = 0
+        self.Skipped = 0       # records that could not be sent (no connection or connection full)
+
+    def buildProtocol(self, addr):
+        self.resetDelay()
+        return ReconnectingClientFactory.buildProtocol(self, addr)
+
+    def update(self): # called in every frame
+        for board in self.Boards:
+            flags = 0
+            if board.ShowSymbols[DisplayRed] == '----':
+                flags |= HubFlagRed
+            if board.ShowSymbols[DisplayGreen] == '----':
+                flags |= HubFlagGreen
+            if board.Game_Running:
+                flags |= HubGameRunning
+            record = (board.CurrentState, flags, int(board.TimeRed * 1000), int(board.TimeGreen * 1000), board.MoveCount & 0xffff)
+            if record == self.Last.get(board.Number):
+                continue
+            if self.Connection is None or self.Paused:
+                self.Skipped += 1
+                continue
+            self.Sequence = (self.Sequence + 1) & 0xffff
+            self.Connection.transport.write(HubRecord.pack(board.Number, self.Sequence, *record))
+            self.Last[board.Number] = record
+            self.Sent += 1
+
+hub = None    # the HubClient, if the clock reports to a hub (see __main__)
+
+# The frame mirror sends every frame that went to a strip to subscribers over UDP, e.g. for a projector or a stream
+# overlay. A subscriber is everyone who sent us the subscribe token (--mirror-token) within the last MirrorTimeout
+# seconds, at most MirrorMaxSubscribers at a time. The mirror listens on MirrorInterface only (--mirror-interface).
+# Only the runs of pixels that changed (the dirty ranges of the FrameBuffer) are sent, plus a complete keyframe every
+# MirrorKeyframePeriod. A new subscriber gets keyframes of the frames sent last right away - only it, not everyone.
+# Every LED channel is mirrored on its own, a datagram always carries pixels of one channel.
+# The render thread only hands the frame over after strip.show(); the reactor encodes and sends it. Frames the reactor
+# has not picked up yet are replaced by newer ones, and a datagram the socket cannot take is dropped - nothing queues.
+MirrorPort = 7422
+MirrorKeyframePeriod = 2.0   # seconds between two keyframes
+MirrorTimeout = 30.0         # seconds a subscription lasts without a new datagram from the subscriber
+MirrorInterface = "127.0.0.1"   # address the mirror listens on (e.g. "0.0.0.0" for all interfaces)
+MirrorMaxSubscribers = 8     # more subscribers at the same time are turned away
+MirrorHeader = struct.Struct("!HBBH") # sequence, LED channel, 1 for a keyframe, number of runs
+MirrorRun = struct.Struct("!HH")      # first pixel, number of pixels - followed by the pixels as 32 bit words
+MirrorGap = 2                # unchanged pixels between two changed ones that are sent anyway instead of starting a new run
+
+class FrameMirror(DatagramProtocol):
+    def __init__(self, Token):
+        self.Token = Token       # a datagram must be exactly this (bytes) to subscribe
+        self.Subscribers = {}    # address -> Now() of its last datagram
+        self.Lock = threading.Lock()
+        self.Latest = {}         # LED channel -> (pixels, dirty ranges) of the newest frame from its render thread, not encoded yet
+        self.Sent = {}           # LED channel -> pixels of the last frame sent to the subscribers (for the keyframe of a new one)
+        self.LastKeyframe = {}   # LED channel -> Now() of its last keyframe (none: the next one is a keyframe)
+        self.Sequence = 0
+        self.Frames = 0
+        self.Keyframes = 0
+        self.Bytes = 0
+        self.Dropped = 0
+        self.Rejected = 0        # datagrams without the token or beyond MirrorMaxSubscribers
+        self.EncodeTiming = Timing("mirror encode")
+
+    def datagramReceived(self, data, address): # subscribe or renew the subscription
+        if data != self.Token:
+            self.Rejected += 1
+            Log(WARNING, "mirror rejected", address="%s:%d" % address[:2], reason="token")
+            return
+        if address not in self.Subscribers:
+            self.expire(Now())
+            if len(self.Subscribers) >= MirrorMaxSubscribers:
+                self.Rejected += 1
+                Log(WARNING, "mirror rejected", address="%s:%d" % address[:2], reason="full")
+                return
+            Log(INFO, "mirror subscriber", address="%s:%d" % address[:2])
+            for channel in sorted(self.Sent):   # the newcomer starts with the frames everybody else has
+                pixels = self.Sent[channel]
+                self.write(self.encode(self.Sequence, channel, True, [(0, len(pixels))], pixels), [address])
+        self.Subscribers[address] = Now()
+
+    def expire(self, t):
+        for address in [a for a in self.Subscribers if t - self.Subscribers[a] > MirrorTimeout]:
+            del self.Subscribers[address]
+
+    def publish(self, Channel, pixels, Dirty): # render thread of Channel
+        with self.Lock:
+            if Channel in self.Latest:
+                self.Dropped += 1
+                self.Latest[Channel] = (pixels, self.Latest[Channel][1] + Dirty)
+                return           # the reactor has not sent the last one yet, it will take this one (and its changes) instead
+            self.Latest[Channel] = (pixels, Dirty)
+        reactor.callFromThread(self.send, Channel)
+
+    def send(self, Channel): # reactor thread
+        with self.Lock:
+            latest = self.Latest.pop(Channel, None)
+        if latest is None:
+            return
+        pixels, dirty = latest
+        self.Sent[Channel] = pixels   # also without subscribers: the first one starts with it
+        if not self.Subscribers:
+            return
+        t = Now()
+        self.expire(t)
+        start = Timer()
+        keyframe = Channel not in self.LastKeyframe or t - self.LastKeyframe[Channel] >= MirrorKeyframePeriod
+        if keyframe:
+            runs = [(0, len(pixels))]
+            self.LastKeyframe[Channel] = t
+        else:
+            runs = [(start, end - start) for start, end in MergeRanges(dirty, MirrorGap)]
+            if not runs:
+                return
+        self.Sequence = (self.Sequence + 1) & 0xffff
+        data = self.encode(self.Sequence, Channel, keyframe, runs, pixels)
+        self.EncodeTiming.add(Timer() - start)
+        self.Frames += 1
+        self.write(data, list(self.Subscribers))
+
+    def encode(self, Sequence, Channel, keyframe, runs, pixels): # the datagram with these (first, count) runs of pixels
+        data = [MirrorHeader.pack(Sequence, Channel, int(keyframe), len(runs))]
+        for first, count in runs:
+            data.append(MirrorRun.pack(first, count))
+            words = pixels[first:first + count]
+            if sys.byteorder == "little":
+                words.byteswap()   # pixels go out in network byte order
+            data.append(words.tobytes())
+        self.Keyframes += int(keyframe)
+        return b"".join(data)
+
+    def write(self, data, addresses):
+        for address in addresses:
+            try:
+                self.transport.write(data, address)
+                self.Bytes += len(data)
+            except socket.error:
+                self.Dropped += 1    # the socket is full - this subscriber misses the frame
+
+def ApplyMirrorFrame(data, Channels): # for subscribers: apply a mirror datagram to their dict LED channel -> array('I') of pixels
+    sequence, channel, keyframe, count = MirrorHeader.unpack_from(data, 0)
+    pixels = Channels[channel]
+    offset = MirrorHeader.size
+    for n in range(count):
+        first, length = MirrorRun.unpack_from(data, offset)
+        offset += MirrorRun.size
+        words = array('I')
+        words.frombytes(data[offset:offset + 4 * length])
+        if sys.byteorder == "little":
+            words.byteswap()
+        pixels[first:first + length] = words
+        offset += 4 * length
+    return sequence, channel, keyframe
+
+mirror = None    # the FrameMirror, if frames are mirrored (see __main__)
+
+frames = {}      # LED channel -> its FrameBuffer (see __main__)
+
+# With --sim the buttons are keys: type a letter and Enter. With several boards a digit selects the board first, e.g. "2g"
+SimulatedButtons = {"m": "minutes", "i": "increment", "s": "start", "x": "reset", "g": "green", "r": "red"}
+
+class SimulatedKeys(LineReceiver):
+    delimiter = b"\n"
+
+    def __init__(self, gpio, Boards):
+        self.GPIO = gpio
+        self.Boards = Boards
+
+    def connectionMade(self):
+        self.transport.write(b"Buttons: m=Minutes i=Increment s=Start/Pause x=Reset g=Green r=Red\n")
+        if len(self.Boards) > 1:
+            self.transport.write(b"Boards: 1-%d before the buttons selects the board (default 1)\n" % len(self.Boards))
+
+    def lineReceived(self, line):
+        board = self.Boards[0]
+        for key in line.decode("ascii", "ignore"):
+            if key.isdigit() and 0 < int(key) <= len(self.Boards):
+                board = self.Boards[int(key) - 1]
+            elif key in SimulatedButtons:
+                self.GPIO.Tick = int(Now() * 1000000) & 0xffffffff   # synthetic ticks follow the real time
+                self.GPIO.press(board.Buttons[SimulatedButtons[key]])
+
+def DumpStats(Events=True): # kill -USR1 <pid> prints all counters and timings (and the last events), at shutdown they are printed too
+    for channel in sorted(frames):
+        print ("Frames sent/skipped/dropped on channel %d: " % channel, frames[channel].FramesSent, frames[channel].FramesSkipped, frames[channel].FramesDropped)
+    print ("Events applied/max queue depth/max latency/ticks clamped: ", events.Applied, events.MaxDepth, events.LatencyMax, TickClamps)
+    print ("Frames/overruns/max late/max duration/lag warnings: ", scheduler.Frames, scheduler.Overruns, scheduler.LateMax, scheduler.DurationMax, scheduler.LagWarnings)
+    if hub is not None:
+        print ("Hub records sent/skipped: ", hub.Sent, hub.Skipped)
+    if mirror is not None:
+        print ("Mirror subscribers/frames/keyframes/bytes/dropped/rejected: ", len(mirror.Subscribers), mirror.Frames, mirror.Keyframes, mirror.Bytes, mirror.Dropped, mirror.Rejected)
+    for board in boards:
+        if board.Snapshot is not None:
+            print ("Snapshot updates/avg cost/max cost of board %d: " % board.Number, board.Snapshot.Updates, board.Snapshot.CostSum / max(1, board.Snapshot.Updates), board.Snapshot.CostMax)
+    for name in sorted(Timings):
+        print ("%-16s %s" % (name, Timings[name].describe()))
+    if Events:
+        print ("Last events:")
+        eventlog.dump(sys.stdout)
 
 # Main program logic follows:
 if __name__ == '__main__':
+        parser = argparse.ArgumentParser(description="The Giant Chess Clock")
+        parser.add_argument("--sim", action="store_true", help="simulated buttons (keyboard) and LEDs, no Raspberry Pi needed")
+        parser.add_argument("--pgn", nargs="?", const=MoveLogFile, metavar="MOVELOG", help="export the recorded games as PGN and exit")
+        parser.add_argument("--layout", default=LayoutFile, metavar="FILE", help="LED layout of a board (JSON, default %s if it exists)" % os.path.basename(LayoutFile))
+        parser.add_argument("--boards", type=int, default=1, choices=range(1, len(BoardSetups) + 1), metavar="N", help="number of boards on this Pi (default 1, at most %d, see BoardSetups)" % len(BoardSetups))
+        parser.add_argument("--hub", metavar="HOST[:PORT]", help="send the state of the clock to this tournament hub")
+        parser.add_argument("--board", type=int, default=1, help="board number of the (first) board at the hub (default 1)")
+        parser.add_argument("--hub-token", metavar="TOKEN", help="token of the hub (required with --hub)")
+        parser.add_argument("--log-level", default=LevelNames[LogLevel], choices=[LevelNames[level] for level in sorted(LevelNames)], help="lowest level of the events that are logged (default %s)" % LevelNames[LogLevel])
+        parser.add_argument("--mirror", type=int, nargs="?", const=MirrorPort, metavar="PORT", help="mirror the LED frames over UDP (default port %d)" % MirrorPort)
+        parser.add_argument("--mirror-interface", default=MirrorInterface, metavar="ADDRESS", help="address the mirror listens on (default %s)" % MirrorInterface)
+        parser.add_argument("--mirror-token", metavar="TOKEN", help="subscribers must send this token (required with --mirror)")
+        args = parser.parse_args()
+        if args.hub and not args.hub_token:
+            parser.error("--hub needs a --hub-token")
+        if args.mirror and not args.mirror_token:
+            parser.error("--mirror needs a --mirror-token")
+        LogLevel = dict((name, level) for level, name in LevelNames.items())[args.log_level]
+        if args.pgn:
+            ExportPGN(ReadMoveLog(args.pgn), sys.stdout)
+            sys.exit(0)
+        if args.layout != LayoutFile or os.path.exists(LayoutFile):
+            layout = LoadLayout(args.layout)
+            CompileGlyphs()
+            LED_COUNT = layout.Count
+        Simulated = args.sim
+        if Simulated:
+            backend = SimulatedBackend()
+        else:
+            backend = HardwareBackend()
+        pi = backend.gpio()
+        setups = BoardSetups[:args.boards]
+        channels = [channel for channel, buttons in setups]
+        for channel in sorted(set(channels)):
+            count = LED_COUNT * channels.count(channel)   # the boards of a channel are chained on its strip
+            frames[channel] = FrameBuffer(backend.strip(channel, count), count, channel)   # everything is drawn here first, see FrameBuffer
+        offsets = dict((channel, 0) for channel in frames)
+        for n in range(len(setups)):
+            channel, buttons = setups[n]
+            board = Board(args.board + n, frames[channel], offsets[channel], buttons)
+            offsets[channel] += LED_COUNT
+            SetupButtons(pi, board)
+            boards.append(board)
         time.sleep(1)   # warten bis alle Taster inititalisiert sind
-        print ("after sleep")
+        eventlog.start(sys.stdout)   # from now on the events are written, see EventLog
+        Log(INFO, "after sleep")
         Ignore_Button_Events = False  # ab jetzt sind die Taster funktionsfaehig
-        # Create NeoPixel object with appropriate configuration.
-        strip = Adafruit_NeoPixel(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, LED_BRIGHTNESS, LED_CHANNEL, LED_STRIP)
-        # Intialize the library (must be called once before other functions).
-        strip.begin()
+        for channel in frames:
+            frames[channel].start()   # from now on only the render threads talk to the strips
 
-        CurrentState = StartState # Now we start with the first State
-        doAction(CurrentState,ActionMinutes)   # Fakes a "Minutes" Button press
+        for n in range(len(boards)):
+            board = boards[n]
+            if not Simulated:       # a simulated clock does not touch the state and moves of the real one
+                board.Snapshot = Snapshot(BoardFile(SnapshotFile, n + 1))
+                board.MoveLog = MoveLog(BoardFile(MoveLogFile, n + 1))
+                reactor.addSystemEventTrigger('before', 'shutdown', board.MoveLog.flush)
+            if board.Snapshot is None or not board.ResumeFromSnapshot(board.Snapshot.load()):   # a game was interrupted by a power loss? Then it is paused now
+                board.CurrentState = StartState # Now we start with the first State
+                board.doAction(board.CurrentState,ActionMinutes)   # Fakes a "Minutes" Button press
+        if Simulated:
+            from twisted.internet import stdio
+            stdio.StandardIO(SimulatedKeys(pi, boards))
 
-        dots = task.LoopingCall(ShowDots)
-        dots.start(0.5) # call every 0.5 second
-        # dots.stop() will stop the looping calls
+        if args.hub:
+            host, _, port = args.hub.partition(":")
+            hub = HubClient(boards, args.hub_token.encode("utf-8"))
+            reactor.connectTCP(host, int(port or HubPort), hub)
 
-        clock = task.LoopingCall(ShowClocks)
-        clock.start(0.1) # call every  100ms
+        if args.mirror:
+            mirror = FrameMirror(args.mirror_token.encode("utf-8"))
+            reactor.listenUDP(args.mirror, mirror, interface=args.mirror_interface)
 
-        decrement = task.LoopingCall(DecrementClocks)
-        decrement.start(0.1) # call every  100ms
-        
-        reactor.run()
+        scheduler.start()   # time update, dots and rendering of all boards, see FrameScheduler
 
+        signal.signal(signal.SIGUSR1, lambda signum, stack: reactor.callFromThread(DumpStats))   # dump on the reactor thread, not inside the handler
+        reactor.addSystemEventTrigger('before', 'shutdown', DumpStats, False)   # the writer writes the events, they are not repeated
+        reactor.addSystemEventTrigger('before', 'shutdown', eventlog.stop)
+        reactor.run()
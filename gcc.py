@@ -0,0 +1,14 @@
+# License: GNU GPL Version 3 (https://www.gnu.org/licenses/gpl-3.0.html)
+# The Giant Chess Clock (g-c-c.py) as a module for its tools (g-c-c-sim.py, g-c-c-bench.py, g-c-c-hub.py)
+#
+# g-c-c.py is a script, not a module - its name is no Python identifier. "import gcc" loads it by path once and
+# puts it in the place of this module, so every tool gets the clock itself (and can replace e.g. gcc.Now).
+#
+import importlib.util
+import os
+import sys
+
+spec = importlib.util.spec_from_file_location(__name__, os.path.join(os.path.dirname(os.path.abspath(__file__)), "g-c-c.py"))
+clock = importlib.util.module_from_spec(spec)
+sys.modules[__name__] = clock    # import returns what is in sys.modules, i.e. the clock
+spec.loader.exec_module(clock)